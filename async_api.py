@@ -1,19 +1,35 @@
 import asyncio
+import functools
 import json
 import traceback
-from typing import List, Optional, Callable
+import weakref
+from contextlib import asynccontextmanager
+from typing import List, Optional, Callable, Dict, Tuple
 
 import aio_pika
 import aiohttp
-import aioredis
 import loguru
 from aio_pika import Message
+from aio_pika.pool import Pool
 
+from api_lib.utils import utils_message
+from api_lib.utils.callback_store import CallbackStore, RedisCallbackStore
+from api_lib.utils.compression import Compression, compress, decompress
 from api_lib.utils.convert_utils import add_progr
+from api_lib.utils.framing import loads_message
 from api_lib.utils.messages import create_callback_message_amqp, CallbackMessage
+from api_lib.utils.metrics import ApiMetrics, api_metrics
+from api_lib.utils.middleware import Middleware, MiddlewareChain, MESSAGE, CALLBACK, SEND
 from api_lib.utils.rabbit_utils import *
-from api_lib.utils.validation_utils import MethodApi, InputParam, check_rls, \
-    find_method
+from api_lib.utils.schema_cache import SchemaCache
+from api_lib.utils.schema_index import SchemaIndex, Route
+from api_lib.utils.validation_utils import MethodApi, InputParam
+
+# Время жизни простаивающего HTTP соединения и записи кеша DNS (секунды)
+HTTP_KEEPALIVE_TIMEOUT = 30
+HTTP_DNS_CACHE_TTL = 300
+# Таймаут HTTP запроса, если он не задан в схеме (секунды)
+HTTP_DEFAULT_TIMEOUT = 60
 
 
 class ApiAsync(object):
@@ -32,7 +48,17 @@ class ApiAsync(object):
                                methods_callback: dict = None,
                                url='http://apidev.mezex.lan/getApiStructProgr',
                                redis_url: str = 'redis://127.0.0.1:6379',
-                               schema: dict = None, is_test=True):
+                               schema: dict = None, is_test=True,
+                               channel_pool_size: int = 10,
+                               callback_ttl: int = 86400,
+                               callback_store: CallbackStore = None,
+                               http_limit_per_host: int = 10,
+                               schema_cache_path: str = None,
+                               schema_offline: bool = False,
+                               compression: Compression = None,
+                               binary_transport: bool = False,
+                               metrics: ApiMetrics = None,
+                               middlewares: List[Middleware] = None):
         r"""
          Создание экземпляра класса
          Args:
@@ -55,16 +81,34 @@ class ApiAsync(object):
         :param url:
         :param redis_url:
         :param methods_callback:
+        :param channel_pool_size: Максимальное количество каналов в пуле для отправки сообщений
+        :param callback_ttl: Время хранения состояния колбека (секунды)
+        :param callback_store: Хранилище состояний колбеков, по умолчанию редис из redis_url
+        :param http_limit_per_host: Максимальное количество HTTP соединений с одним хостом
+        :param schema_cache_path: Файл кеша схемы. Если кеш есть, схема загружается из него,
+         а актуальность проверяется условным запросом к серверу апи в фоне
+        :param schema_offline: Запуск только из кеша схемы, без запросов к серверу апи
+        :param compression: Сжатие исходящих сообщений больше порога (получатели должны поддерживать
+         content_encoding). Входящие сжатые сообщения распаковываются всегда
+        :param binary_transport: Передавать двоичные значения параметров bin/base64 без base64: по AMQP
+         в бинарном формате (получатели должны его поддерживать), по HTTP - multipart.
+         Входящие сообщения в бинарном формате разбираются всегда
+        :param metrics: Метрики обработки сообщений и запросов, по умолчанию общие для процесса
+         (выдача по HTTP: metrics.start_http_server(port))
+        :param middlewares: Middleware вокруг вызова обработчиков методов и колбеков и отправки запросов
+         (см. utils.middleware)
          """
-        self = ApiAsync(service_name, user_api, pass_api, redis_url, methods, url, schema, methods_callback, is_test)
+        self = ApiAsync(service_name, user_api, pass_api, redis_url, methods, url, schema, methods_callback, is_test,
+                        channel_pool_size, callback_ttl, callback_store, http_limit_per_host, schema_cache_path,
+                        schema_offline, compression, binary_transport, metrics, middlewares)
         # Для тестов можно загружать словарь
         self.schema = None
         if schema is not None:
-            self.schema = schema
+            self.set_schema(schema)
         else:
             await self.get_schema()
 
-        ping = await self.redis.ping()
+        ping = await self.callback_store.ping()
 
         return self
 
@@ -75,7 +119,17 @@ class ApiAsync(object):
                  methods: dict = None,
                  url='http://apidev.mezex.lan/getApiStructProgr',
                  schema: dict = None,
-                 methods_callback=None, is_test=True):
+                 methods_callback=None, is_test=True,
+                 channel_pool_size: int = 10,
+                 callback_ttl: int = 86400,
+                 callback_store: CallbackStore = None,
+                 http_limit_per_host: int = 10,
+                 schema_cache_path: str = None,
+                 schema_offline: bool = False,
+                 compression: Compression = None,
+                 binary_transport: bool = False,
+                 metrics: ApiMetrics = None,
+                 middlewares: List[Middleware] = None):
         r"""
         Args:
             user_api: логин для получения схемы
@@ -83,6 +137,16 @@ class ApiAsync(object):
             url: адрес для схемы
             service_name: Название текущего сервиса
             methods_callback: Словарь обработчиков колбеков {название метода: функция}
+            channel_pool_size: Максимальное количество каналов в пуле для отправки сообщений
+            callback_ttl: Время хранения состояния колбека (секунды)
+            callback_store: Хранилище состояний колбеков, по умолчанию редис из redis_url
+            http_limit_per_host: Максимальное количество HTTP соединений с одним хостом
+            schema_cache_path: Файл кеша схемы (см. create_api_async)
+            schema_offline: Запуск только из кеша схемы, без запросов к серверу апи
+            compression: Сжатие исходящих сообщений (см. create_api_async)
+            binary_transport: Передача двоичных параметров без base64 (см. create_api_async)
+            metrics: Метрики обработки сообщений и запросов (см. create_api_async)
+            middlewares: Middleware вокруг вызова обработчиков и отправки запросов (см. create_api_async)
             methods: Словарь обработчиков для каждого метода сервиса {название метода: функция}
         функция(params: dict,
         response_id: str,
@@ -101,8 +165,18 @@ class ApiAsync(object):
         self.methods_callback = methods_callback
         self.channel = None
         self.connection = None
+        self._connection_lock = asyncio.Lock()
+        # Запросы call(), ожидающие ответа {id сообщения: future}
+        self._pending_calls: Dict[str, asyncio.Future] = {}
+        # Пул каналов долгоживущего подключения для отправки сообщений
+        self.channel_pool = Pool(self._create_channel, max_size=channel_pool_size)
+        # Проверенные обменники каждого канала {канал aiormq: {имя: обменник}},
+        # при переоткрытии канала aiormq создается заново и кеш сбрасывается
+        self._exchanges: 'weakref.WeakKeyDictionary[object, Dict[str, aio_pika.Exchange]]' = \
+            weakref.WeakKeyDictionary()
         self.redis_url = redis_url
         self.redis = None
+        self.callback_ttl = callback_ttl
 
         # Данные для получения схемы апи
         self.url = url
@@ -111,6 +185,8 @@ class ApiAsync(object):
 
         # Обработчики методов сервиса
         self.methods_service = methods
+        # Количество обработанных сообщений очереди сервиса
+        self.processed_messages = 0
 
         # AMQP
         self.port = None
@@ -121,83 +197,280 @@ class ApiAsync(object):
         self.user_amqp = None
         self.credentials = None
         self.schema = schema
-
-        # Redis
-        self.redis: aioredis.Redis
-        self.redis_connection(redis_url)
+        self.schema_index: Optional[SchemaIndex] = SchemaIndex(schema) if schema is not None else None
+
+        # HTTP: общая сессия с пулом соединений (создается при первом запросе)
+        self.http_limit_per_host = http_limit_per_host
+        self._http_session: Optional[aiohttp.ClientSession] = None
+
+        # Кеш схемы апи
+        self.schema_cache = SchemaCache(schema_cache_path) if schema_cache_path else None
+        self.schema_offline = schema_offline
+        self._schema_revalidate_task: Optional[asyncio.Task] = None
+        self._schema_refresh_task: Optional[asyncio.Task] = None
+
+        # Сжатие исходящих сообщений
+        self.compression = compression
+        self.binary_transport = binary_transport
+
+        # Метрики
+        self.metrics = metrics if metrics is not None else api_metrics
+        # Middleware обработчиков и отправки запросов
+        self.middleware = MiddlewareChain(middlewares)
+
+        # Хранилище состояний колбеков
+        self.callback_store: CallbackStore
+        if callback_store is not None:
+            self.callback_store = callback_store
+        else:
+            self.redis_connection(redis_url)
 
         # logger
         self.logger = loguru.logger
 
     def redis_connection(self, redis_url: str):
-        self.redis = aioredis.from_url(redis_url)
+        self.callback_store = RedisCallbackStore(redis_url)
+        self.redis = self.callback_store.redis
+
+    def get_http_session(self) -> aiohttp.ClientSession:
+        """ Общая HTTP сессия с keep-alive соединениями и кешем DNS """
+        if self._http_session is None or self._http_session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.http_limit_per_host,
+                                             ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                                             keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT)
+            self._http_session = aiohttp.ClientSession(connector=connector)
+        return self._http_session
 
     async def get_schema(self) -> dict:
-        """ Асинхронное получение схемы """
-        async with aiohttp.ClientSession(auth=aiohttp.BasicAuth(self.user_api, self.pass_api)) as session:
-            async with session.post(self.url, data={'format': 'json'}) as response:
-                text_json = await response.text()
-        content_json = json.loads(text_json)
-        self.schema = content_json
+        """ Асинхронное получение схемы (из кеша с проверкой актуальности в фоне, если он задан) """
+        if self.schema_cache is not None:
+            content_json = self.schema_cache.load()
+            if content_json is not None:
+                self.logger.info(f'[Schema] Схема загружена из кеша {self.schema_cache.path}')
+                self.set_schema(content_json)
+                if not self.schema_offline:
+                    self._schema_revalidate_task = asyncio.create_task(self.refresh_schema())
+                return content_json
+        if self.schema_offline:
+            raise SchemaCacheNotFound(self.schema_cache.path if self.schema_cache else None)
+
+        status, content, etag = await self._fetch_schema()
+        if status != 200:
+            raise SchemaLoadFailed(status)
+        # В кеш записывается только ответ, разобранный как json
+        content_json = utils_message.loads(content)
+        if self.schema_cache is not None:
+            self.schema_cache.save(content, etag)
+        self.set_schema(content_json)
         return content_json
 
-    async def listen_queue(self):
+    async def _fetch_schema(self, headers: dict = None) -> Tuple[int, bytes, Optional[str]]:
+        """ Запрос схемы к серверу апи: (код ответа, тело, ETag) """
+        async with self.get_http_session().post(self.url, data={'format': 'json'}, headers=headers,
+                                                auth=aiohttp.BasicAuth(self.user_api, self.pass_api)) as response:
+            return response.status, await response.read(), response.headers.get('ETag')
+
+    async def revalidate_schema(self) -> Optional[dict]:
+        """
+        Условный запрос схемы к серверу апи с обновлением кеша.
+        :return: Новая схема, None если схема не изменилась или сервер апи недоступен
+        """
+        headers = self.schema_cache.conditional_headers() if self.schema_cache is not None else {}
+        try:
+            status, content, etag = await self._fetch_schema(headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f'[Schema] Не удалось проверить актуальность схемы: {e!r}')
+            return None
+        if status == 304:
+            return None
+        if status != 200:
+            self.logger.warning(f'[Schema] Сервер апи вернул код {status}')
+            return None
+        if self.schema_cache is not None and not self.schema_cache.is_changed(content):
+            return None
+        try:
+            schema = utils_message.loads(content)
+        except ValueError as e:
+            self.logger.warning(f'[Schema] Ответ сервера апи не является схемой: {e!r}')
+            return None
+        if self.schema_cache is not None:
+            self.schema_cache.save(content, etag)
+            self.logger.info(f'[Schema] Кеш схемы {self.schema_cache.path} обновлен')
+        return schema
+
+    def set_schema(self, schema: dict):
+        """ Установка схемы апи с компиляцией индекса методов (только изменившихся сервисов) """
+        self.schema_index = SchemaIndex(schema, previous=self.schema_index)
+        self.schema = schema
+        self._set_service_amqp_params()
+
+    def _set_service_amqp_params(self):
+        self.queue = get_queue_service(self.service_name, self.schema)
+        self.exchange = get_exchange_service(self.service_name, self.schema)
+        self.address_amqp = get_amqp_address_service(self.service_name, self.schema)
+        self.user_amqp = get_amqp_username_service(self.service_name, self.schema)
+        self.pass_amqp = get_amqp_password_service(self.service_name, self.schema)
+        self.port = get_port_amqp_service(self.service_name, self.schema)
+
+    async def refresh_schema(self, schema: dict = None) -> bool:
+        """
+        Обновление схемы без перезапуска сервиса.
+        Перекомпилируются только изменившиеся сервисы, индекс и схема подменяются целиком,
+        обработчики, уже получившие метод из старого индекса, дорабатывают с ним.
+        :param schema: Новая схема, по умолчанию условный запрос к серверу апи
+        :return: True если схема изменилась
+        """
+        if schema is None:
+            schema = await self.revalidate_schema()
+            if schema is None:
+                return False
+        if self.service_name not in schema:
+            self.logger.error(f'[Schema] В новой схеме нет сервиса {self.service_name}, обновление пропущено')
+            return False
+        schema_index = SchemaIndex(schema, previous=self.schema_index)
+        if not schema_index.changed_services:
+            return False
+
+        self.schema_index, self.schema = schema_index, schema
+        if self.service_name in schema_index.changed_services:
+            self.logger.warning(f'[Schema] Изменилось описание текущего сервиса {self.service_name}, '
+                                f'новые параметры подключения применятся при переподключении')
+            self._set_service_amqp_params()
+        self.logger.info(f'[Schema] Схема обновлена, изменены сервисы: '
+                         f'{", ".join(sorted(schema_index.changed_services))}')
+        return True
+
+    def start_schema_refresh(self, interval: float = 300) -> asyncio.Task:
+        """
+        Периодическая проверка актуальности схемы в фоновой задаче (останавливается в close).
+        :param interval: Период проверки в секундах
+        """
+
+        async def refresh_loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.refresh_schema()
+                except Exception as e:
+                    self.logger.error(f'[Schema] Ошибка обновления схемы: {e!r}')
+
+        self._schema_refresh_task = asyncio.create_task(refresh_loop())
+        return self._schema_refresh_task
+
+    async def listen_queue(self, concurrency: int = 1, prefetch_count: int = None):
+        r"""
+        Слушает очередь сообщений сервиса.
+
+        Args:
+            concurrency: Количество одновременно обрабатываемых сообщений.
+             При значении больше 1 каждое сообщение обрабатывается в отдельной задаче
+             и подтверждается после окончания обработки.
+            prefetch_count: Количество неподтвержденных сообщений, выдаваемых брокером (QoS канала).
+             По умолчанию равно concurrency.
+        """
         connection = await self.make_connection()
         channel: aio_pika.Channel = await connection.channel()
+        if prefetch_count is None and concurrency > 1:
+            prefetch_count = concurrency
+        if prefetch_count:
+            await channel.set_qos(prefetch_count=prefetch_count)
         queue_name = get_queue_service(self.service_name, self.schema)
         queue: aio_pika.Queue = await channel.get_queue(queue_name)
-        async with queue.iterator() as queue_iter:
-            async for message in queue_iter:
-                message: aio_pika.IncomingMessage
-                async with message.process():
-                    # Проверка серилизации
-                    try:
-                        data = json.loads(message.body.decode('utf-8'))
-                        exchange_name_callback = get_exchange_service(data['service_callback'], self.schema)
-                        queue_name_callback = get_queue_service(data['service_callback'], self.schema)
-                        self.logger.info(f"[SER] Серилизован {data=}")
-                    except Exception as e:
-                        self.logger.info(f"[SER] Ошибка серилизации {message.body.decode('utf-8')}")
-                        continue
-                    if 'response_id' in data:
-                        try:
-                            self.logger.info("[Callback] Начало обработки коллбека")
-                            body = await self.process_callback_message(data)
-                            if body is None:
-                                self.logger.info(f"[Callback] Сообщение отработано без ответа!")
-                                continue
-                            out_message = Message(body.encode('utf-8'))
-                            self.logger.info(f"[Callback] Конец обработки колбека{body=}")
-                        except KeyError as e:
-                            self.logger.error(f"[Callback] не найден метод {e}")
-                            continue
-                        except TypeError as e:
-                            self.logger.error(f"[Callback] не указаны доступные методы для обработки колбека")
-                            continue
-                        except Exception as e:
-                            self.logger.error(e)
-                            continue
+
+        if concurrency <= 1:
+            async with queue.iterator() as queue_iter:
+                async for message in queue_iter:
+                    await self._process_queue_message(message, channel)
+            return
+
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = set()
+
+        async def process_task(message: aio_pika.IncomingMessage):
+            try:
+                await self._process_queue_message(message, channel)
+            except Exception as e:
+                self.logger.error(f"[Message] Ошибка обработки сообщения {e}")
+            finally:
+                semaphore.release()
+
+        try:
+            async with queue.iterator() as queue_iter:
+                async for message in queue_iter:
+                    await semaphore.acquire()
+                    task = asyncio.create_task(process_task(message))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            # Дожидаемся сообщений, которые уже находятся в обработке
+            if tasks:
+                await asyncio.wait(tasks)
+
+    async def _process_queue_message(self, message: aio_pika.IncomingMessage, channel: aio_pika.Channel):
+        """ Обработка одного сообщения из очереди сервиса """
+        try:
+            await self._handle_queue_message(message, channel)
+        finally:
+            self.processed_messages += 1
+
+    async def _handle_queue_message(self, message: aio_pika.IncomingMessage, channel: aio_pika.Channel):
+        async with message.process():
+            # Проверка серилизации
+            try:
+                payload = decompress(message.body, message.content_encoding)
+            except Exception as e:
+                self.logger.error(f"[SER] Ошибка распаковки сообщения {message.content_encoding=}: {e!r}")
+                return
+            try:
+                data = loads_message(payload)
+                route_callback: Route = self.schema_index.get_route(data['service_callback'])
+                # Текст сообщения формируется, только если уровень INFO включен
+                self.logger.opt(lazy=True).info("[SER] Серилизован data={!r}", lambda: data)
+            except Exception as e:
+                self.logger.info(f"[SER] Ошибка серилизации {payload.decode('utf-8', errors='replace')}")
+                return
+            method_label = self.metrics.method_label(data.get('method'), self.methods_service)
+            self.metrics.message_size.observe(len(payload), 'in', method_label)
+            if 'response_id' in data:
+                try:
+                    self.logger.info("[Callback] Начало обработки коллбека")
+                    body = await self.process_callback_message(data)
+                    if body is None:
+                        self.logger.info(f"[Callback] Сообщение отработано без ответа!")
+                        return
+                    out_message = self.make_message(body.encode('utf-8'))
+                    self.logger.opt(lazy=True).info("[Callback] Конец обработки колбека body={!r}", lambda: body)
+                except KeyError as e:
+                    self.logger.error(f"[Callback] не найден метод {e}")
+                    return
+                except TypeError as e:
+                    self.logger.error(f"[Callback] не указаны доступные методы для обработки колбека")
+                    return
+                except Exception as e:
+                    self.logger.error(e)
+                    return
+            else:
+                try:
+                    self.logger.info("[Message] Начало обработки сообщения")
+                    out = await self.process_incoming_message(data)
+                    if out is None:
+                        out_message = None
                     else:
-                        try:
-                            self.logger.info("[Message] Начало обработки сообщения")
-                            out = await self.process_incoming_message(data)
-                            if out is None:
-                                out_message = None
-                            else:
-                                out_message = Message(out.encode('utf-8'))
-                            self.logger.info(f"[Message] Конец обработки сообщения{out=}")
-                        except Exception as e:
-                            self.logger.info(f"[Message] {e}")
-                            continue
-
-                    if out_message is not None:
-                        exchange_callback = await channel.get_exchange(exchange_name_callback)
-                        await exchange_callback.publish(out_message, routing_key=get_route_key(queue_name_callback))
-
-                        self.logger.info(f"Сообщение отправлено в очередь {queue_name_callback}")
-
-    @staticmethod
-    async def api_http_request(method: MethodApi, params: List[InputParam]):
+                        out_body = out.encode('utf-8')
+                        self.metrics.message_size.observe(len(out_body), 'reply', method_label)
+                        out_message = self.make_message(out_body)
+                    self.logger.opt(lazy=True).info("[Message] Конец обработки сообщения out={!r}", lambda: out)
+                except Exception as e:
+                    self.logger.info(f"[Message] {e}")
+                    return
+
+            if out_message is not None:
+                exchange_callback = await self.get_exchange(channel, route_callback.exchange)
+                await exchange_callback.publish(out_message, routing_key=route_callback.routing_key)
+
+                self.logger.info(f"Сообщение отправлено в очередь {route_callback.queue}")
+
+    async def api_http_request(self, method: MethodApi, params: List[InputParam]):
         url = method.get_url_http()
         if method.config.auth:
             auth = aiohttp.BasicAuth(method.config.username,
@@ -205,31 +478,121 @@ class ApiAsync(object):
         else:
             auth = None
 
-        message = method.get_message_http(params)
-        async with aiohttp.ClientSession(auth=auth) as session:
-            if method.config.type == 'POST':
-                async with session.post(url, data=message) as resp:
-                    return await resp.json()
-            elif method.config.type == 'GET':
-                async with session.get(url, data=message) as resp:
-                    return await resp.json()
+        message = self._get_message_http(method, params)
+        timeout = aiohttp.ClientTimeout(total=method.config.get_timeout_seconds() or HTTP_DEFAULT_TIMEOUT)
+        session = self.get_http_session()
+        if method.config.type == 'POST':
+            async with session.post(url, data=message, auth=auth, timeout=timeout) as resp:
+                return await resp.json()
+        elif method.config.type == 'GET':
+            async with session.get(url, data=message, auth=auth, timeout=timeout) as resp:
+                return await resp.json()
+
+    def _get_message_http(self, method: MethodApi, params: List[InputParam]):
+        """ Тело HTTP запроса: multipart, если есть двоичные параметры и включен binary_transport """
+        if not self.binary_transport:
+            return method.get_message_http(params)
+        fields, files = method.get_message_http_multipart(params)
+        if not files:
+            return method.get_message_http(params)
+        form = aiohttp.FormData(fields)
+        for name, value in files.items():
+            form.add_field(name, bytes(value), filename=name, content_type='application/octet-stream')
+        return form
 
     async def api_amqp_request(self, method: MethodApi, params: List[InputParam], callback_method_name: str = '',
                                additional_data: dict = None):
-        connection = await self.make_connection()
-        channel: aio_pika.Channel = await connection.channel()
-        message = method.get_message_amqp(params, self.service_name, callback_method_name)
-        exchange = await channel.get_exchange(name=method.config.exchange)
-        json_message = message.json()
-        await exchange.publish(message=aio_pika.Message(json_message.encode('utf-8')),
-                               routing_key=get_route_key(method.config.quenue))
+        message = method.get_message_amqp(params, self.service_name, callback_method_name, self.binary_transport)
+        await self._publish_amqp_messages(method, [message])
         if callback_method_name and callback_method_name in self.methods_callback:
-            self.redis: aioredis.Redis
-            redis_add_data = message.json(additional_data=additional_data)
-            await self.redis.set(message.id, redis_add_data)
-        await connection.close()
+            state = message.json(additional_data=additional_data)
+            await self.callback_store.put(message.id, state, self.callback_ttl)
         return message.id
 
+    async def api_amqp_request_many(self, method: MethodApi, params_list: List[List[InputParam]],
+                                    callback_method_name: str = '', additional_data: dict = None,
+                                    requested_service: str = None) -> List[str]:
+        r"""
+        Отправка пачки сообщений одного метода через один канал с записью состояний колбеков одной операцией.
+        Каждое сообщение отправляется через middleware отдельно, как запрос send_request_api.
+        :param requested_service: Сервис - адресат для контекста middleware
+        """
+        messages = [method.get_message_amqp(params, self.service_name, callback_method_name, self.binary_transport)
+                    for params in params_list]
+        async with self._acquire_exchange(method) as exchange:
+            for params, message in zip(params_list, messages):
+                async def publish(method: MethodApi, params: List[InputParam], message=message) -> str:
+                    await self._publish_message(exchange, method, message)
+                    return message.id
+
+                await self.middleware.acall(SEND, method.name, requested_service, publish, method, params)
+        if callback_method_name and callback_method_name in self.methods_callback:
+            await self.callback_store.put_many(
+                [(message.id, message.json(additional_data=additional_data)) for message in messages],
+                self.callback_ttl)
+        return [message.id for message in messages]
+
+    async def _publish_amqp_messages(self, method: MethodApi, messages: List[IncomingMessage]):
+        """ Отправка сообщений через канал из пула """
+        async with self._acquire_exchange(method) as exchange:
+            for message in messages:
+                await self._publish_message(exchange, method, message)
+
+    @asynccontextmanager
+    async def _acquire_exchange(self, method: MethodApi):
+        """ Обменник метода на канале из пула """
+        async with self.channel_pool.acquire() as channel:
+            channel: aio_pika.Channel
+            if channel.is_closed:
+                await channel.reopen()
+            yield await self.get_exchange(channel, method.config.exchange)
+
+    async def _publish_message(self, exchange: aio_pika.Exchange, method: MethodApi, message: IncomingMessage):
+        body = message.to_bytes()
+        self.metrics.message_size.observe(len(body), 'out', method.name)
+        await exchange.publish(message=self.make_message(body), routing_key=get_route_key(method.config.quenue))
+
+    def make_message(self, body: bytes) -> Message:
+        """ Исходящее AMQP сообщение, сжатое при превышении порога """
+        body, content_encoding = compress(body, self.compression)
+        return Message(body, content_encoding=content_encoding)
+
+    async def get_exchange(self, channel: aio_pika.Channel, name: str) -> aio_pika.Exchange:
+        """ Обменник из кеша канала, существование обменника проверяется один раз на канал """
+        exchanges = self._exchanges.get(channel.channel)
+        if exchanges is None:
+            exchanges = self._exchanges[channel.channel] = {}
+        exchange = exchanges.get(name)
+        if exchange is None:
+            exchange = exchanges[name] = await channel.get_exchange(name)
+        return exchange
+
+    async def get_connection(self) -> aio_pika.RobustConnection:
+        """ Долгоживущее подключение текущего сервиса, переподключение выполняется автоматически """
+        async with self._connection_lock:
+            if self.connection is None or self.connection.is_closed:
+                self.connection = await self.make_connection()
+        return self.connection
+
+    async def _create_channel(self) -> aio_pika.Channel:
+        """ Создание канала для пула """
+        connection = await self.get_connection()
+        return await connection.channel()
+
+    async def close(self):
+        """ Закрытие пула каналов, HTTP сессии и подключений """
+        for task in (self._schema_revalidate_task, self._schema_refresh_task):
+            if task is not None:
+                task.cancel()
+        if not self.channel_pool.is_closed:
+            await self.channel_pool.close()
+        if self.connection is not None and not self.connection.is_closed:
+            await self.connection.close()
+        self.connection = None
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        await self.callback_store.close()
+
     async def make_connection(self, service_name: str = None) -> aio_pika.Connection:
         """ Создаем подключение """
         if service_name is not None:
@@ -270,51 +633,153 @@ class ApiAsync(object):
             :param callback_method_name:
         """
 
+        method = self._get_requested_method(method_name, requested_service)
+
+        with self.metrics.track_request(requested_service, method_name, method.type_conn) as started:
+            if method.type_conn == 'HTTP':
+                return await self.middleware.acall(SEND, method_name, requested_service,
+                                                   self.api_http_request, method, params)
+
+            # Контекст middleware одинаков для всех отправок: аргументы (method, params)
+            send = functools.partial(self.api_amqp_request, callback_method_name=callback_method_name,
+                                     additional_data=additional_data)
+            message_id = await self.middleware.acall(SEND, method_name, requested_service, send, method, params)
+        if callback_method_name and callback_method_name in self.methods_callback:
+            self.metrics.callback_expected(message_id, requested_service, method_name, started)
+        return message_id
+
+    async def send_many_request_api(self, method_name: str,
+                                    params_list: List[List[InputParam]],
+                                    requested_service: str,
+                                    callback_method_name: str = None,
+                                    additional_data: dict = None) -> list:
+        r"""
+        Отправка пачки запросов одного метода на сервис.
+        Для AMQP сообщения отправляются через один канал, а состояния колбеков
+        записываются в хранилище одной операцией.
+
+        Args:
+           method_name: имя метод апи.
+           params_list: Список параметров для каждого запроса.
+           requested_service: Имя сервиса - адресата.
+           callback_method_name: Метод - обработчик колбека.
+           additional_data: Дополнительные данные для каждого запроса по AMQP.
+        Returns:
+            Список результатов send_request_api в порядке params_list
+        """
+        method = self._get_requested_method(method_name, requested_service)
+
+        with self.metrics.track_request(requested_service, method_name, method.type_conn,
+                                        count=len(params_list)) as started:
+            if method.type_conn == 'HTTP':
+                return list(await asyncio.gather(*[
+                    self.middleware.acall(SEND, method_name, requested_service, self.api_http_request, method, params)
+                    for params in params_list]))
+
+            message_ids = await self.api_amqp_request_many(method, params_list, callback_method_name,
+                                                           additional_data, requested_service)
+        if callback_method_name and callback_method_name in self.methods_callback:
+            for message_id in message_ids:
+                self.metrics.callback_expected(message_id, requested_service, method_name, started)
+        return message_ids
+
+    async def call(self, method_name: str,
+                   params: List[InputParam],
+                   requested_service: str,
+                   timeout: float = 30):
+        r"""
+        Запрос на сервис с ожиданием ответа.
+        Ответ сопоставляется с запросом по id сообщения внутри процесса, без записи в редис,
+        поэтому для получения ответа должен быть запущен listen_queue текущего сервиса.
+
+        Args:
+           method_name: имя метод апи.
+           params: Параметры.
+           requested_service: Имя сервиса - адресата.
+           timeout: Время ожидания ответа в секундах.
+        Raises:
+           asyncio.TimeoutError - ответ не получен за timeout.
+           Остальные исключения аналогичны send_request_api.
+        Returns:
+            При AMQP - колбек сервиса (CallbackMessage). При HTTP - текст сообщения
+        """
+        method = self._get_requested_method(method_name, requested_service)
+
+        if method.type_conn == 'HTTP':
+            with self.metrics.track_request(requested_service, method_name, method.type_conn):
+                return await self.middleware.acall(SEND, method_name, requested_service,
+                                                   self.api_http_request, method, params)
+
+        # Случайный id: одинаковые запросы (например к методам write) отправляются и ожидают ответа отдельно
+        message = method.get_message_amqp(params, self.service_name, '', self.binary_transport,
+                                          id_strategy=utils_message.RANDOM_ID)
+        future = asyncio.get_running_loop().create_future()
+        self._pending_calls[message.id] = future
+
+        async def publish(method: MethodApi, params: List[InputParam]) -> str:
+            await self._publish_amqp_messages(method, [message])
+            return message.id
+
+        try:
+            with self.metrics.track_request(requested_service, method_name, method.type_conn) as started:
+                await self.middleware.acall(SEND, method_name, requested_service, publish, method, params)
+            self.metrics.callback_expected(message.id, requested_service, method_name, started)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending_calls.pop(message.id, None)
+
+    def _get_requested_method(self, method_name: str, requested_service: str) -> MethodApi:
+        """ Поиск метода сервиса - адресата с проверкой доступности """
         if requested_service not in self.schema:
             raise ServiceNotFound
-        
+
         if self.is_test:
             requested_service = add_progr(requested_service)
-        method = find_method(method_name, self.schema[requested_service])
-        check_rls(self.schema[self.service_name], requested_service, self.service_name, method_name)
-
-        if method.type_conn == 'HTTP':
-            return await self.api_http_request(method, params)
-
-        if method.type_conn == 'AMQP':
-            return await self.api_amqp_request(method, params, callback_method_name, additional_data)
+        method = self.schema_index.get_method(requested_service, method_name)
+        self.schema_index.rls.check(self.service_name, requested_service, method_name)
+        return method
 
     async def process_incoming_message(self, data: dict) -> Optional[str]:
         # Проверка наличия такого сервиса в схеме АПИ
         service_callback = data['service_callback']
+        # Служебные поля извлекаются из data при проверке параметров, поэтому сохраняются заранее
+        message_id = data.get('id')
+        method_name = data['method']
         try:
             config_service = self.schema[service_callback]['AMQP']['config']
         except:
             return
         # Проверка доступности метода
-        try:
-            check_rls(service_from_schema=self.schema[service_callback], service_to_name=self.service_name,
-                      service_from_name=service_callback, method_name=data['method'])
-        except (ServiceMethodNotAllowed, AllServiceMethodsNotAllowed):
-            error_message = {'error': f"Метод {data['method']} не доступен из сервиса {service_callback}"}
-            body_message = create_callback_message_amqp(error_message, False, data['id'],
+        if not self.schema_index.rls.is_allowed(service_callback, self.service_name, method_name):
+            error_message = self.schema_index.rls.denial_error(service_callback, method_name)
+            body_message = create_callback_message_amqp(error_message, False, message_id,
                                                         service_name=self.service_name)
             return body_message
 
         # Вызов функции для обработки метода
+        method_label = self.metrics.method_label(method_name, self.methods_service)
+        started = self.metrics.message_started(method_label)
+        error = True
         try:
-            callback_message = await self.methods_service[data['method']](check_params_amqp(
-                self.schema[self.service_name],
-                data))
+            handler = self.methods_service[method_name]
+            message = check_params_amqp(self.schema[self.service_name],
+                                        data,
+                                        self.schema_index.get_method(self.service_name, method_name),
+                                        owned=True)
+            callback_message = await self.middleware.acall(MESSAGE, method_name, service_callback,
+                                                           handler, message)
+            error = False
         except KeyError as e:
-            error_message = {'error': f"Метод {data['method']} не поддерживается"}
-            body_message = create_callback_message_amqp(error_message, False, data['id'])
+            error_message = {'error': f"Метод {method_name} не поддерживается"}
+            body_message = create_callback_message_amqp(error_message, False, message_id)
             return body_message
         except Exception as e:
             self.logger.error(traceback.format_exc())
             error_message = {'error': f"Ошибка {str(e)}"}
-            body_message = create_callback_message_amqp(error_message, False, data['id'])
+            body_message = create_callback_message_amqp(error_message, False, message_id)
             return body_message
+        finally:
+            self.metrics.message_finished(method_label, started, error)
 
         if callback_message is None:
             return
@@ -325,15 +790,20 @@ class ApiAsync(object):
 
     async def process_callback_message(self, message: dict):
         callback_message = CallbackMessage.from_dict(message)
-        self.redis: aioredis.Redis
-        redis_message = await self.redis.get(callback_message.response_id)
-        if not redis_message:
+        self.metrics.callback_received(callback_message.response_id)
+        # Ответ на запрос call() передается ожидающему без обращения к редису
+        future = self._pending_calls.get(callback_message.response_id)
+        if future is not None:
+            if not future.done():
+                future.set_result(callback_message)
+            return
+        state = await self.callback_store.pop(callback_message.response_id)
+        if not state:
             return
-        message: IncomingMessage = IncomingMessage.from_dict(json.loads(redis_message.decode('utf-8')))
+        message: IncomingMessage = IncomingMessage.from_owned_dict(utils_message.loads(state))
         if not message or message.method_callback not in self.methods_callback:
             return
         callback_message.incoming_message = message
-        response = await self.methods_callback[message.method_callback](callback_message)
-        # удаляем сообщения после обработки
-        await self.redis.delete(callback_message.response_id)
+        response = await self.middleware.acall(CALLBACK, message.method_callback, callback_message.service_callback,
+                                               self.methods_callback[message.method_callback], callback_message)
         return response
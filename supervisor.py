@@ -0,0 +1,192 @@
+""" Запуск нескольких процессов-обработчиков очереди сервиса """
+import asyncio
+import inspect
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import loguru
+
+# Сигналы остановки супервизора, блокируются на время запуска процесса-обработчика
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def _report_processed(api, counter, stop_event: threading.Event, interval: float):
+    """ Передача количества обработанных сообщений процессу-супервизору """
+    while not stop_event.wait(interval):
+        counter.value = api.processed_messages
+
+
+def _run_sync_worker(api, listen_kwargs: dict):
+    def on_sigterm(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    try:
+        api.listen_queue(**listen_kwargs)
+    finally:
+        api.close()
+
+
+async def _run_async_worker(factory: Callable, listen_kwargs: dict, counter, report_interval: float):
+    api = await factory()
+    stop_event = threading.Event()
+    threading.Thread(target=_report_processed, args=(api, counter, stop_event, report_interval),
+                     daemon=True).start()
+    listen_task = asyncio.create_task(api.listen_queue(**listen_kwargs))
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, listen_task.cancel)
+    try:
+        await listen_task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        stop_event.set()
+        await api.close()
+
+
+def _worker_main(factory: Callable, listen_kwargs: dict, counter, report_interval: float):
+    """ Точка входа процесса-обработчика: своё подключение и свой цикл listen_queue """
+    # Сигналы заблокированы на время fork: до сброса обработчиков супервизора они не обрабатываются.
+    # Процесс останавливает супервизор (SIGTERM), SIGINT от терминала игнорируется
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+    if inspect.iscoroutinefunction(factory):
+        asyncio.run(_run_async_worker(factory, listen_kwargs, counter, report_interval))
+        return
+
+    api = factory()
+    # Подтверждение после обработки: сообщение, обрабатываемое при остановке, будет доставлено повторно
+    listen_kwargs = {'workers': 1, **listen_kwargs}
+    stop_event = threading.Event()
+    threading.Thread(target=_report_processed, args=(api, counter, stop_event, report_interval),
+                     daemon=True).start()
+    try:
+        _run_sync_worker(api, listen_kwargs)
+    finally:
+        stop_event.set()
+
+
+class Supervisor(object):
+    r"""
+    Запускает N процессов-обработчиков, перезапускает упавшие и останавливает их по SIGTERM.
+    ApiSync слушает очередь в режиме пула потоков (по умолчанию workers=1), сообщения подтверждаются
+    после обработки. В ApiAsync обработка прерывается отменой listen_queue, прерванное сообщение
+    отклоняется без возврата в очередь (теряется, если у очереди нет dead letter exchange).
+    """
+
+    def __init__(self, factory: Callable,
+                 workers: int = None,
+                 listen_kwargs: dict = None,
+                 report_interval: float = 60,
+                 restart_delay: float = 1,
+                 stop_timeout: float = 30):
+        r"""
+        Args:
+            factory: Функция создания экземпляра ApiSync или корутина создания ApiAsync,
+             вызывается в каждом процессе-обработчике
+            workers: Количество процессов, по умолчанию количество ядер
+            listen_kwargs: Параметры для listen_queue (например workers/concurrency, prefetch_count)
+            report_interval: Период вывода количества обработанных сообщений (секунды)
+            restart_delay: Задержка перед перезапуском упавшего процесса (секунды)
+            stop_timeout: Время ожидания завершения процессов при остановке (секунды)
+        """
+        self.factory = factory
+        self.workers = workers or os.cpu_count() or 1
+        self.listen_kwargs = listen_kwargs or {}
+        self.report_interval = report_interval
+        self.restart_delay = restart_delay
+        self.stop_timeout = stop_timeout
+        self.logger = loguru.logger
+
+        self._context = multiprocessing.get_context('fork')
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._counters = {index: self._context.Value('Q', 0) for index in range(self.workers)}
+        self._last_counts = {index: 0 for index in range(self.workers)}
+        self._stop_event = threading.Event()
+
+    def _start_worker(self, index: int):
+        process = self._context.Process(target=_worker_main,
+                                        args=(self.factory, self.listen_kwargs, self._counters[index],
+                                              min(self.report_interval, 1)),
+                                        name=f'api-worker-{index}')
+        # Сигнал, пришедший сразу после fork, не должен вызвать обработчик супервизора в новом процессе
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        try:
+            process.start()
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+        self._processes[index] = process
+        self.logger.info(f'[Supervisor] Запущен обработчик {index} pid={process.pid}')
+
+    def _restart_dead_workers(self):
+        for index, process in list(self._processes.items()):
+            if process.is_alive() or self._stop_event.is_set():
+                continue
+            self.logger.error(f'[Supervisor] Обработчик {index} pid={process.pid} завершился '
+                              f'с кодом {process.exitcode}, перезапуск')
+            process.join()
+            # Счетчик нового процесса начинается с нуля
+            self._counters[index].value = 0
+            self._last_counts[index] = 0
+            if self._stop_event.wait(self.restart_delay):
+                return
+            self._start_worker(index)
+
+    def _report(self, elapsed: float):
+        total = 0.0
+        for index in range(self.workers):
+            count = self._counters[index].value
+            rate = (count - self._last_counts[index]) / elapsed
+            self._last_counts[index] = count
+            total += rate
+            self.logger.info(f'[Supervisor] Обработчик {index}: {rate:.1f} сообщений/с, всего {count}')
+        self.logger.info(f'[Supervisor] Всего: {total:.1f} сообщений/с')
+
+    def stop(self, *args):
+        """ Остановка супервизора и всех обработчиков """
+        self._stop_event.set()
+
+    def _shutdown(self):
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.stop_timeout
+        for index, process in self._processes.items():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                self.logger.warning(f'[Supervisor] Обработчик {index} не завершился, принудительная остановка')
+                process.kill()
+                process.join()
+        self.logger.info('[Supervisor] Все обработчики остановлены')
+
+    def run(self):
+        """ БЛОКИРУЮЩАЯ ФУНКЦИЯ. Запуск обработчиков до получения SIGTERM/SIGINT """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.workers):
+            self._start_worker(index)
+
+        last_report = time.monotonic()
+        try:
+            while not self._stop_event.wait(0.5):
+                self._restart_dead_workers()
+                now = time.monotonic()
+                if now - last_report >= self.report_interval:
+                    self._report(now - last_report)
+                    last_report = now
+        finally:
+            self._shutdown()
+
+
+def run_workers(factory: Callable, workers: Optional[int] = None, **kwargs):
+    """
+    Запуск нескольких процессов-обработчиков очереди сервиса.
+    :param factory: Функция создания ApiSync или корутина создания ApiAsync
+    :param workers: Количество процессов, по умолчанию количество ядер
+    :param kwargs: Параметры Supervisor
+    """
+    Supervisor(factory, workers=workers, **kwargs).run()
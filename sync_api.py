@@ -1,16 +1,33 @@
+import functools
+import threading
 import traceback
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 import loguru
 import pika
+import pika.exceptions
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 
+from api_lib.utils import utils_message
+from api_lib.utils.compression import Compression, compress, decompress
 from api_lib.utils.convert_utils import add_progr
+from api_lib.utils.framing import loads_message
 from api_lib.utils.loggers import rabbit_logger
 from api_lib.utils.messages import create_callback_message_amqp
+from api_lib.utils.metrics import ApiMetrics, api_metrics
+from api_lib.utils.middleware import Middleware, MiddlewareChain, MESSAGE, SEND
 from api_lib.utils.rabbit_utils import *
-from api_lib.utils.validation_utils import find_method, InputParam, MethodApi, check_rls
+from api_lib.utils.schema_cache import SchemaCache
+from api_lib.utils.schema_index import SchemaIndex, Route
+from api_lib.utils.validation_utils import InputParam, MethodApi
+
+
+# Таймаут HTTP запроса, если он не задан в схеме (секунды)
+HTTP_DEFAULT_TIMEOUT = 60
 
 
 class NotFoundParams(Exception):
@@ -28,7 +45,15 @@ class ApiSync:
                  create_queue_exchange=False,
                  url='http://apidev.mezex.lan/getApiStructProgr',
                  schema: dict = None,
-                 heartbeat: int = 60):
+                 heartbeat: int = 60,
+                 http_pool_size: int = 10,
+                 http_retries: int = 3,
+                 schema_cache_path: str = None,
+                 schema_offline: bool = False,
+                 compression: Compression = None,
+                 binary_transport: bool = False,
+                 metrics: ApiMetrics = None,
+                 middlewares: List[Middleware] = None):
         r"""
         Args:
             user_api: логин для получения схемы
@@ -36,6 +61,19 @@ class ApiSync:
             url: адрес для схемы
             service_name: Название текущего сервиса
             create_queue_exchange: Создавать и связывать очередь и обменник сервиса
+            http_pool_size: Количество keep-alive соединений с одним хостом
+            http_retries: Количество повторов HTTP запроса при ошибке соединения или ответе 502/503/504
+            schema_cache_path: Файл кеша схемы. Если кеш есть, схема загружается из него,
+             а актуальность проверяется условным запросом к серверу апи в фоне
+            schema_offline: Запуск только из кеша схемы, без запросов к серверу апи
+            compression: Сжатие исходящих сообщений больше порога (получатели должны поддерживать
+             content_encoding). Входящие сжатые сообщения распаковываются всегда
+            binary_transport: Передавать двоичные значения параметров bin/base64 без base64: по AMQP
+             в бинарном формате (получатели должны его поддерживать), по HTTP - multipart.
+             Входящие сообщения в бинарном формате разбираются всегда
+            metrics: Метрики обработки сообщений и запросов, по умолчанию общие для процесса
+             (выдача по HTTP: metrics.start_http_server(port))
+            middlewares: Middleware вокруг вызова обработчиков методов и отправки запросов (см. utils.middleware)
             methods: Словарь обработчиков для каждого метода сервиса {название метода: функция}
         функция(params: dict,
         response_id: str,
@@ -68,21 +106,54 @@ class ApiSync:
         self.credentials = None
         self.credentials: pika.PlainCredentials
 
+        # Переиспользуемое подключение для отправки сообщений (открывается при первой отправке)
+        self._publish_connection: Optional[pika.BlockingConnection] = None
+        self._publish_channel = None
+        self._publish_lock = threading.Lock()
+
+        # Количество обработанных сообщений очереди сервиса
+        self.processed_messages = 0
+
+        # HTTP сессия с пулом соединений
+        self.http_session = self._create_http_session(http_pool_size, http_retries)
+
+        # Кеш схемы апи
+        self.schema_cache = SchemaCache(schema_cache_path) if schema_cache_path else None
+        self.schema_offline = schema_offline
+        self._schema_refresh_stop = threading.Event()
+
+        # Сжатие исходящих сообщений
+        self.compression = compression
+        self.binary_transport = binary_transport
+
+        # Метрики
+        self.metrics = metrics if metrics is not None else api_metrics
+        # Middleware обработчиков и отправки запросов
+        self.middleware = MiddlewareChain(middlewares)
+
+        self.logger = rabbit_logger
         # Для тестов можно загружать словарь
         self.schema = None
         if schema is not None:
             self.schema = schema
         self.get_schema_sync()
-        self.logger = rabbit_logger
         check_methods_handlers(self.schema[self.service_name], methods)
         if create_queue_exchange:
             self.create_queue_exchange_bind()
 
     def get_schema_sync(self) -> dict:
+        revalidate = False
         if self.schema is None:
-            self.schema = json.loads(requests.post(self.url, auth=HTTPBasicAuth(self.user_api, self.pass_api),
-                                                   data={'format': 'json'}).text)
+            self.schema, revalidate = self._load_schema()
 
+        self.schema_index = SchemaIndex(self.schema)
+        self._set_service_amqp_params()
+        if revalidate:
+            threading.Thread(target=self.refresh_schema, daemon=True).start()
+
+        return self.schema
+
+    def _set_service_amqp_params(self):
         self.queue = get_queue_service(self.service_name, self.schema)
         self.exchange = get_exchange_service(self.service_name, self.schema)
         self.address_amqp = get_amqp_address_service(self.service_name, self.schema)
@@ -91,7 +162,104 @@ class ApiSync:
         self.port = get_port_amqp_service(self.service_name, self.schema)
         self.credentials = pika.PlainCredentials(self.user_amqp, self.pass_amqp)
 
-        return self.schema
+    def refresh_schema(self, schema: dict = None) -> bool:
+        """
+        Обновление схемы без перезапуска сервиса.
+        Перекомпилируются только изменившиеся сервисы, индекс и схема подменяются целиком,
+        обработчики, уже получившие метод из старого индекса, дорабатывают с ним.
+        :param schema: Новая схема, по умолчанию условный запрос к серверу апи
+        :return: True если схема изменилась
+        """
+        if schema is None:
+            schema = self.revalidate_schema()
+            if schema is None:
+                return False
+        if self.service_name not in schema:
+            self.logger.error(f'[Schema] В новой схеме нет сервиса {self.service_name}, обновление пропущено')
+            return False
+        schema_index = SchemaIndex(schema, previous=self.schema_index)
+        if not schema_index.changed_services:
+            return False
+
+        self.schema_index, self.schema = schema_index, schema
+        if self.service_name in schema_index.changed_services:
+            self.logger.warning(f'[Schema] Изменилось описание текущего сервиса {self.service_name}, '
+                                f'новые параметры подключения применятся при переподключении')
+            self._set_service_amqp_params()
+        self.logger.info(f'[Schema] Схема обновлена, изменены сервисы: '
+                         f'{", ".join(sorted(schema_index.changed_services))}')
+        return True
+
+    def start_schema_refresh(self, interval: float = 300) -> threading.Thread:
+        """
+        Периодическая проверка актуальности схемы в фоновом потоке.
+        :param interval: Период проверки в секундах
+        """
+
+        def refresh_loop():
+            while not self._schema_refresh_stop.wait(interval):
+                try:
+                    self.refresh_schema()
+                except Exception as e:
+                    self.logger.error(f'[Schema] Ошибка обновления схемы: {e!r}')
+
+        thread = threading.Thread(target=refresh_loop, daemon=True)
+        thread.start()
+        return thread
+
+    def _fetch_schema(self, headers: dict = None) -> requests.Response:
+        return self.http_session.post(self.url, auth=HTTPBasicAuth(self.user_api, self.pass_api),
+                                      data={'format': 'json'}, headers=headers, timeout=HTTP_DEFAULT_TIMEOUT)
+
+    def _load_schema(self) -> Tuple[dict, bool]:
+        """
+        Схема из кеша или с сервера апи.
+        :return: (схема, нужна ли проверка актуальности схемы из кеша)
+        """
+        if self.schema_cache is not None:
+            schema = self.schema_cache.load()
+            if schema is not None:
+                self.logger.info(f'[Schema] Схема загружена из кеша {self.schema_cache.path}')
+                return schema, not self.schema_offline
+        if self.schema_offline:
+            raise SchemaCacheNotFound(self.schema_cache.path if self.schema_cache else None)
+
+        response = self._fetch_schema()
+        if response.status_code != 200:
+            raise SchemaLoadFailed(response.status_code)
+        # В кеш записывается только ответ, разобранный как json
+        schema = utils_message.loads(response.content)
+        if self.schema_cache is not None:
+            self.schema_cache.save(response.content, response.headers.get('ETag'))
+        return schema, False
+
+    def revalidate_schema(self) -> Optional[dict]:
+        """
+        Условный запрос схемы к серверу апи с обновлением кеша.
+        :return: Новая схема, None если схема не изменилась или сервер апи недоступен
+        """
+        headers = self.schema_cache.conditional_headers() if self.schema_cache is not None else {}
+        try:
+            response = self._fetch_schema(headers)
+        except requests.RequestException as e:
+            self.logger.warning(f'[Schema] Не удалось проверить актуальность схемы: {e!r}')
+            return None
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            self.logger.warning(f'[Schema] Сервер апи вернул код {response.status_code}')
+            return None
+        if self.schema_cache is not None and not self.schema_cache.is_changed(response.content):
+            return None
+        try:
+            schema = utils_message.loads(response.content)
+        except ValueError as e:
+            self.logger.warning(f'[Schema] Ответ сервера апи не является схемой: {e!r}')
+            return None
+        if self.schema_cache is not None:
+            self.schema_cache.save(response.content, response.headers.get('ETag'))
+            self.logger.info(f'[Schema] Кеш схемы {self.schema_cache.path} обновлен')
+        return schema
 
     def create_queue_exchange_bind(self):
         connection = self._open_amqp_connection_current_service()
@@ -107,55 +275,122 @@ class ApiSync:
         channel.close()
         connection.close()
 
-    def listen_queue(self):
+    def listen_queue(self, workers: int = None, prefetch_count: int = None):
         """
             БЛОКИРУЮЩАЯ ФУНКЦИЯ.
             Слушает очередь сообщений сервиса.
             Валидирует входящее и исходящее сообщение.
             Обработка методов в соответствии с обработчиками конструктора.
+            :param workers: Количество потоков для обработки сообщений. Если не указано, сообщения
+             обрабатываются в потоке подключения и подтверждаются до обработки.
+            :param prefetch_count: Количество неподтвержденных сообщений (QoS канала), по умолчанию равно workers
         """
 
         def on_request2(ch, method_request, props, body):
             ch.basic_ack(delivery_tag=method_request.delivery_tag)
+            reply = self._process_body(body, props.content_encoding)
+            if reply is not None:
+                self._publish_reply(ch, *reply)
+            self.processed_messages += 1
+
+        connection = self._open_amqp_connection_current_service()
+        channel = connection.channel()
+
+        if not workers:
+            channel.basic_consume(on_message_callback=on_request2, queue=self.queue)
+            channel.start_consuming()
+            return
+
+        channel.basic_qos(prefetch_count=prefetch_count or workers)
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+        def finish(ch, delivery_tag, reply):
+            # Выполняется в потоке подключения: pika не потокобезопасна
+            if reply is not None:
+                self._publish_reply(ch, *reply)
+            ch.basic_ack(delivery_tag=delivery_tag)
+            self.processed_messages += 1
+
+        def work(ch, delivery_tag, body, content_encoding):
             try:
-                # Проверка серилизации
-                data = json.loads(body.decode('utf-8'))
-                exchange_name_callback = get_exchange_service(data['service_callback'], self.schema)
-                queue_name_callback = get_queue_service(data['service_callback'], self.schema)
-                self.logger.info(f"[SER] Серилизован {data=}")
+                reply = self._process_body(body, content_encoding)
             except Exception as e:
-                self.logger.info(f"[SER] Ошибка серилизации {body.decode('utf-8')}")
-                return
+                self.logger.error(f"[Message] Ошибка обработки сообщения {e}")
+                reply = None
+            try:
+                connection.add_callback_threadsafe(functools.partial(finish, ch, delivery_tag, reply))
+            except pika.exceptions.AMQPError as e:
+                # Неподтвержденное сообщение будет доставлено повторно
+                self.logger.error(f"[Message] Подключение закрыто, сообщение не подтверждено {e!r}")
 
-            if 'response_id' in data:
-                # Обработка колбека
-                self.logger.warning('[Callback] У синхронной версии библиотеки не доступна обработка колбека')
-                return
-            else:
-                # Обработка обычного сообщения
+        def on_request_pool(ch, method_request, props, body):
+            executor.submit(work, ch, method_request.delivery_tag, body, props.content_encoding)
+
+        channel.basic_consume(on_message_callback=on_request_pool, queue=self.queue)
+        try:
+            channel.start_consuming()
+        finally:
+            executor.shutdown(wait=True)
+            # Ответы и подтверждения завершенных обработчиков, ожидающие потока подключения
+            if connection.is_open:
                 try:
-                    self.logger.info("[Message] Начало обработки сообщения")
-                    out = self.process_incoming_message(data)
-                    if out is None:
-                        out_message = None
-                    else:
-                        out_message = out.encode('utf-8')
-                    self.logger.info(f"[Message] Конец обработки сообщения {out=}")
-                except Exception as e:
-                    self.logger.info(f"[Message] {e}")
-                    return
+                    connection.process_data_events(time_limit=0)
+                    connection.close()
+                except pika.exceptions.AMQPError as e:
+                    self.logger.error(f"[Message] Подключение закрыто, сообщения не подтверждены {e!r}")
 
-            if out_message is not None:
-                ch.basic_publish(exchange=exchange_name_callback,
-                                 routing_key=get_route_key(queue_name_callback),
-                                 body=out_message)
-                self.logger.info(f"Сообщение отправлено в очередь {queue_name_callback}")
+    def _process_body(self, body: bytes, content_encoding: str = None) -> Optional[Tuple[Route, bytes]]:
+        """
+        Обработка тела входящего сообщения
+        :param content_encoding: Сжатие сообщения (свойство content_encoding)
+        :return: (адрес сервиса для ответа, тело ответа) или None, если ответ не требуется
+        """
+        try:
+            body = decompress(body, content_encoding)
+        except Exception as e:
+            self.logger.error(f"[SER] Ошибка распаковки сообщения {content_encoding=}: {e!r}")
+            return
+        try:
+            # Проверка серилизации
+            data = loads_message(body)
+            route_callback = self.schema_index.get_route(data['service_callback'])
+            # Текст сообщения формируется, только если уровень INFO включен
+            self.logger.opt(lazy=True).info("[SER] Серилизован data={!r}", lambda: data)
+        except Exception as e:
+            self.logger.info(f"[SER] Ошибка серилизации {body.decode('utf-8', errors='replace')}")
+            return
+        method_label = self.metrics.method_label(data.get('method'), self.methods_service)
+        self.metrics.message_size.observe(len(body), 'in', method_label)
 
-        connection = self._open_amqp_connection_current_service()
-        channel = connection.channel()
+        if 'response_id' in data:
+            # Обработка колбека
+            self.logger.warning('[Callback] У синхронной версии библиотеки не доступна обработка колбека')
+            return
+        else:
+            # Обработка обычного сообщения
+            try:
+                self.logger.info("[Message] Начало обработки сообщения")
+                out = self.process_incoming_message(data)
+                if out is None:
+                    out_message = None
+                else:
+                    out_message = out.encode('utf-8')
+                self.logger.opt(lazy=True).info("[Message] Конец обработки сообщения out={!r}", lambda: out)
+            except Exception as e:
+                self.logger.info(f"[Message] {e}")
+                return
 
-        channel.basic_consume(on_message_callback=on_request2, queue=self.queue)
-        channel.start_consuming()
+        if out_message is not None:
+            self.metrics.message_size.observe(len(out_message), 'reply', method_label)
+            return route_callback, out_message
+
+    def _publish_reply(self, channel, route: Route, body: bytes):
+        body, properties = self._compress(body)
+        channel.basic_publish(exchange=route.exchange,
+                              routing_key=route.routing_key,
+                              body=body,
+                              properties=properties)
+        self.logger.info(f"Сообщение отправлено в очередь {route.queue}")
 
     def send_request_api(self, method_name: str,
                          params: Union[InputParam, List[InputParam]], requested_service: str):
@@ -180,14 +415,17 @@ class ApiSync:
             requested_service = add_progr(requested_service)
         if requested_service not in self.schema:
             raise ServiceNotFound(service_name=requested_service)
-        method = find_method(method_name, self.schema[requested_service])
-        check_rls(self.schema[self.service_name], requested_service, self.service_name, method_name)
+        method = self.schema_index.get_method(requested_service, method_name)
+        self.schema_index.rls.check(self.service_name, requested_service, method_name)
 
-        if method.type_conn == 'HTTP':
-            return self._make_request_api_http(method, params)
+        with self.metrics.track_request(requested_service, method_name, method.type_conn):
+            if method.type_conn == 'HTTP':
+                return self.middleware.call(SEND, method_name, requested_service,
+                                            self._make_request_api_http, method, params)
 
-        if method.type_conn == 'AMQP':
-            return self._make_request_api_amqp(method, params)
+            if method.type_conn == 'AMQP':
+                return self.middleware.call(SEND, method_name, requested_service,
+                                            self._make_request_api_amqp, method, params)
 
     def get_url(self, filename, extension):
         if self.is_test:
@@ -203,7 +441,7 @@ class ApiSync:
         self.logger.info(f"[SEND_FILE] Отправка файла в файловый сервис")
         url = self.get_url(filename, extension)
         try:
-            image_uuid = requests.post(url, data=file_data_base64).text
+            image_uuid = self.http_session.post(url, data=file_data_base64, timeout=HTTP_DEFAULT_TIMEOUT).text
         except Exception as e:
             self.logger.info(f"[ACCIDENT-I] Ошибка отправки изображения: {str(e)}")
             return "error"
@@ -212,7 +450,16 @@ class ApiSync:
         return image_uuid
 
     @staticmethod
-    def _make_request_api_http(method: MethodApi, params: List[InputParam]) -> str:
+    def _create_http_session(pool_size: int, retries: int) -> requests.Session:
+        """ Сессия с пулом keep-alive соединений и повторами запросов с нарастающей задержкой """
+        session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _make_request_api_http(self, method: MethodApi, params: List[InputParam]) -> str:
         r"""
         Запрос на определенный метод сервиса через http.
 
@@ -224,16 +471,29 @@ class ApiSync:
             str: Ответ сервиса.
         """
         url = method.get_url_http()
-        message = method.get_message_http(params)
         headers = {'Content-type': 'application/json', 'Accept': 'application/json'}
+        files = None
+        if self.binary_transport:
+            message, files = method.get_message_http_multipart(params)
+            if files:
+                # Заголовок с границей частей multipart формирует requests
+                headers = {'Accept': 'application/json'}
+            else:
+                files = None
+                message = method.get_message_http(params)
+        else:
+            message = method.get_message_http(params)
         auth = None
         if method.config.auth:
             auth = HTTPBasicAuth(method.config.username, method.config.password)
+        timeout = method.config.get_timeout_seconds() or HTTP_DEFAULT_TIMEOUT
         response = None
         if method.config.type == 'POST':
-            response = requests.post(url, headers=headers, data=message, auth=auth).text
+            response = self.http_session.post(url, headers=headers, data=message, files=files, auth=auth,
+                                              timeout=timeout).text
         if method.config.type == 'GET':
-            response = requests.get(url, data=message, headers=headers, auth=auth).text
+            response = self.http_session.get(url, data=message, files=files, headers=headers, auth=auth,
+                                             timeout=timeout).text
 
         return response
 
@@ -258,25 +518,69 @@ class ApiSync:
         Returns:
             str: id отправленного сообщения
         """
-        connection = self._open_amqp_connection_current_service()
-        channel = connection.channel()
+        message = method.get_message_amqp(params, self.service_name, callback_method_name, self.binary_transport)
+        body = message.to_bytes()
+        self.metrics.message_size.observe(len(body), 'out', method.name)
 
-        message = method.get_message_amqp(params, self.service_name, callback_method_name)
-
-        channel.basic_publish(exchange=method.config.exchange,
-                              routing_key=get_route_key(method.config.quenue),
-                              body=message.json().encode('utf-8'))
-
-        channel.close()
-        connection.close()
+        self._publish(exchange=method.config.exchange,
+                      routing_key=get_route_key(method.config.quenue),
+                      body=body)
 
         return message.id
 
+    def _get_publish_channel(self):
+        """ Канал переиспользуемого подключения, подключение открывается при первом обращении """
+        if self._publish_connection is None or self._publish_connection.is_closed:
+            self._publish_connection = self._open_amqp_connection_current_service()
+            self._publish_channel = None
+        else:
+            # Обработка накопившихся heartbeat-кадров, обрыв подключения обнаруживается здесь
+            self._publish_connection.process_data_events(time_limit=0)
+        if self._publish_channel is None or self._publish_channel.is_closed:
+            self._publish_channel = self._publish_connection.channel()
+        return self._publish_channel
+
+    def _compress(self, body: bytes) -> Tuple[bytes, Optional[pika.BasicProperties]]:
+        """ Сжатие исходящего сообщения: (тело, свойства с content_encoding или None) """
+        body, content_encoding = compress(body, self.compression)
+        if content_encoding is None:
+            return body, None
+        return body, pika.BasicProperties(content_encoding=content_encoding)
+
+    def _publish(self, exchange: str, routing_key: str, body: bytes):
+        """ Отправка сообщения через переиспользуемое подключение с одной попыткой переподключения """
+        body, properties = self._compress(body)
+        with self._publish_lock:
+            try:
+                self._get_publish_channel().basic_publish(exchange=exchange, routing_key=routing_key, body=body,
+                                                          properties=properties)
+            except (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError) as e:
+                self.logger.warning(f'[AMQP] Переподключение для отправки сообщения: {e!r}')
+                self._close_publish_connection()
+                self._get_publish_channel().basic_publish(exchange=exchange, routing_key=routing_key, body=body,
+                                                          properties=properties)
+
+    def _close_publish_connection(self):
+        try:
+            if self._publish_connection is not None and self._publish_connection.is_open:
+                self._publish_connection.close()
+        except pika.exceptions.AMQPError:
+            pass
+        self._publish_connection = None
+        self._publish_channel = None
+
+    def close(self):
+        """ Закрытие переиспользуемого подключения и HTTP сессии """
+        self._schema_refresh_stop.set()
+        with self._publish_lock:
+            self._close_publish_connection()
+        self.http_session.close()
+
     def send_callback(self, service_name: str, message: dict, response_id: str, result: bool,
                       method_callback: str, channel=None):
         """
         Отправка колбека через кролика.
-        :param channel: открытое соединение с кроликов. Если не указан будет создано временное
+        :param channel: открытое соединение с кроликов. Если не указан, используется переиспользуемое подключение
         :param method_callback: колбек для обработки метода
         :param result: результат
         :param response_id: id сообщения на который делается колбек.
@@ -284,56 +588,62 @@ class ApiSync:
         :param message: сообщение
         :return:
         """
-        queue_callback = get_queue_service(service_name, self.schema)
-        exchange_callback = get_exchange_service(service_name, self.schema)
+        route = self.schema_index.get_route(service_name)
         callback_message = create_callback_message_amqp(message=message, result=result,
                                                         response_id=response_id)
 
         if not channel:
-            connection = self._open_amqp_connection_current_service()
-            channel = connection.channel()
-            channel.basic_publish(exchange=exchange_callback,
-                                  routing_key=get_route_key(queue_callback),
-                                  body=callback_message.encode('utf-8'))
-            channel.close()
-            connection.close()
+            self._publish(exchange=route.exchange,
+                          routing_key=route.routing_key,
+                          body=callback_message.encode('utf-8'))
         else:
-            channel.basic_publish(exchange=exchange_callback,
-                                  routing_key=get_route_key(queue_callback),
-                                  body=callback_message.encode('utf-8'))
+            body, properties = self._compress(callback_message.encode('utf-8'))
+            channel.basic_publish(exchange=route.exchange,
+                                  routing_key=route.routing_key,
+                                  body=body,
+                                  properties=properties)
 
     def process_incoming_message(self, data: dict) -> Optional[str]:
         # Проверка наличия такого сервиса в схеме АПИ
         service_callback = data['service_callback']
+        # Служебные поля извлекаются из data при проверке параметров, поэтому сохраняются заранее
+        message_id = data.get('id')
+        method_name = data['method']
         try:
             config_service = self.schema[service_callback]['AMQP']['config']
         except KeyError as e:
             self.logger.error(f'Нет сервиса {service_callback} в апи')
             return
         # Проверка доступности метода
-        try:
-            check_rls(service_from_schema=self.schema[service_callback], service_to_name=self.service_name,
-                      service_from_name=service_callback, method_name=data['method'])
-        except (ServiceMethodNotAllowed, AllServiceMethodsNotAllowed):
-            error_message = {'error': f"Метод {data['method']} не доступен из сервиса {service_callback}"}
-            body_message = create_callback_message_amqp(error_message, False, data['id'],
+        if not self.schema_index.rls.is_allowed(service_callback, self.service_name, method_name):
+            error_message = self.schema_index.rls.denial_error(service_callback, method_name)
+            body_message = create_callback_message_amqp(error_message, False, message_id,
                                                         service_name=self.service_name)
             return body_message
 
         # Вызов функции для обработки метода
+        method_label = self.metrics.method_label(method_name, self.methods_service)
+        started = self.metrics.message_started(method_label)
+        error = True
         try:
-            callback_message = self.methods_service[data['method']](check_params_amqp(
-                self.schema[self.service_name],
-                data))
+            handler = self.methods_service[method_name]
+            message = check_params_amqp(self.schema[self.service_name],
+                                        data,
+                                        self.schema_index.get_method(self.service_name, method_name),
+                                        owned=True)
+            callback_message = self.middleware.call(MESSAGE, method_name, service_callback, handler, message)
+            error = False
         except KeyError as e:
-            error_message = {'error': f"Метод {data['method']} не поддерживается"}
-            body_message = create_callback_message_amqp(error_message, False, data['id'])
+            error_message = {'error': f"Метод {method_name} не поддерживается"}
+            body_message = create_callback_message_amqp(error_message, False, message_id)
             return body_message
         except Exception as e:
             self.logger.error(traceback.format_exc())
             error_message = {'error': f"Ошибка {str(e)}"}
-            body_message = create_callback_message_amqp(error_message, False, data['id'])
+            body_message = create_callback_message_amqp(error_message, False, message_id)
             return body_message
+        finally:
+            self.metrics.message_finished(method_label, started, error)
 
         if callback_message is None:
             return
@@ -349,13 +659,8 @@ class ApiSync:
         r"""
             Запрос на определенный метод сервиса через кролика без валидации.
         """
-        connection = self._open_amqp_connection_current_service()
-        channel = connection.channel()
         exchange = get_exchange_service(service_name, self.schema)
-        channel.basic_publish(exchange=exchange,
-                              routing_key=get_route_key(service_name),
-                              body=message.encode('utf-8'))
+        self._publish(exchange=exchange,
+                      routing_key=get_route_key(service_name),
+                      body=message.encode('utf-8'))
         self.logger.info(f'Отправлено сообщение без обработки {exchange=} {service_name=} ')
-
-        channel.close()
-        connection.close()
@@ -0,0 +1,67 @@
+""" Бенчмарк отправки сообщений ApiAsync: подключение на каждый запрос против пула каналов.
+
+Требуется доступный RabbitMQ из test_schema_rpc.
+Запуск: python -m api_lib.tests.benchmarks.bench_amqp_publish
+"""
+import asyncio
+import time
+import uuid
+
+import aio_pika
+
+from api_lib.async_api import ApiAsync
+from api_lib.tests.test_data import test_schema_rpc
+from api_lib.utils.rabbit_utils import get_route_key
+from api_lib.utils.validation_utils import InputParam, find_method
+
+COUNT = 1000
+
+
+def make_params():
+    return [
+        InputParam(name='test_str', value='123'),
+        InputParam(name='guid', value=str(uuid.uuid4())),
+        InputParam(name='bin', value=b'123123'),
+        InputParam(name='float', value=3333.33),
+        InputParam(name='int', value=3333),
+        InputParam(name='bool', value=True),
+        InputParam(name='base64', value='base64=312fdvfbg2tgt'),
+        InputParam(name='date', value='2002-12-12T05:55:33±05:00'),
+    ]
+
+
+async def send_with_new_connection(api: ApiAsync):
+    """ Старое поведение: подключение и канал на каждое сообщение """
+    method = find_method('test_method', api.schema['CallbackService'])
+    message = method.get_message_amqp(make_params(), api.service_name, '')
+    connection = await api.make_connection()
+    channel = await connection.channel()
+    exchange = await channel.get_exchange(name=method.config.exchange)
+    await exchange.publish(aio_pika.Message(message.json().encode('utf-8')),
+                           routing_key=get_route_key(method.config.quenue))
+    await connection.close()
+
+
+async def send_with_pool(api: ApiAsync):
+    await api.send_request_api(method_name='test_method', requested_service='CallbackService',
+                               params=make_params())
+
+
+async def measure(name: str, func, api: ApiAsync):
+    start = time.perf_counter()
+    for _ in range(COUNT):
+        await func(api)
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {COUNT / elapsed:.1f} сообщений/с')
+
+
+async def main():
+    api = await ApiAsync.create_api_async(service_name='SendService', schema=test_schema_rpc,
+                                          user_api='test', pass_api='test', is_test=False)
+    await measure('Подключение на каждый запрос', send_with_new_connection, api)
+    await measure('Пул каналов', send_with_pool, api)
+    await api.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+""" Бенчмарк проверки пачки сообщений: по одному сообщению против пакетной проверки по столбцам.
+
+Запуск: python -m api_lib.tests.benchmarks.bench_batch_validation
+"""
+import time
+import uuid
+
+from api_lib.tests.test_data import test_schema_rpc
+from api_lib.utils.validation_utils import InputParam, find_method, rows_to_columns
+
+ROWS = 20000
+
+
+def make_rows():
+    return [{
+        'test_str': f'value{index}',
+        'guid': str(uuid.uuid4()),
+        'bin': '123123',
+        'float': 3333.33,
+        'int': index,
+        'bool': True,
+        'base64': 'base64=312fdvfbg2tgt',
+        'date': '2002-12-12T05:55:33±05:00',
+    } for index in range(ROWS)]
+
+
+def measure(name: str, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {ROWS / elapsed:,.0f} сообщений/с')
+
+
+def main():
+    method = find_method('test_method', test_schema_rpc['CallbackService'])
+    rows = make_rows()
+    columns = rows_to_columns(rows)
+
+    measure('check_params(InputParam.from_dict)',
+            lambda: [method.check_params(InputParam.from_dict(row)) for row in rows])
+    measure('check_params_dict', lambda: [method.check_params_dict(row) for row in rows])
+    measure('check_params_batch (строки)', lambda: method.check_params_batch(rows))
+    measure('check_params_batch (столбцы)', lambda: method.check_params_batch(columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+""" Бенчмарк формирования исходящего сообщения: двойная серилизация против серилизации за один проход.
+
+Запуск: python -m api_lib.tests.benchmarks.bench_message_id
+"""
+import copy
+import hashlib
+import json
+import time
+
+from api_lib.utils import utils_message
+from api_lib.utils.messages import IncomingMessage
+
+MESSAGES = 2000
+PARAM_SIZES = (10, 1000, 100000)
+
+
+def legacy_message(params: dict) -> str:
+    """ Формирование сообщения как в get_message_amqp до серилизации за один проход """
+    message = {'service_callback': 'SERVICE', 'method': 'method', 'method_callback': 'callback', **params}
+    message['id'] = hashlib.md5(json.dumps(message, ensure_ascii=True, default=str).encode('utf-8')).hexdigest()
+    copied = copy.copy(message)
+    for key in ('id', 'method_callback', 'service_callback', 'method'):
+        del copied[key]
+    return json.dumps({'method': message['method'], 'service_callback': message['service_callback'],
+                       'method_callback': message['method_callback'], **copied, 'id': message['id']},
+                      ensure_ascii=True, default=str)
+
+
+def measure(name: str, func, params: dict):
+    start = time.perf_counter()
+    for _ in range(MESSAGES):
+        func(params)
+    elapsed = time.perf_counter() - start
+    print(f'  {name}: {MESSAGES / elapsed:,.0f} сообщений/с')
+
+
+def main():
+    for size in PARAM_SIZES:
+        params = {'text': 'x' * size, 'numbers': list(range(size // 10))}
+        print(f'Параметры ~{size} символов')
+        measure('двойная серилизация (md5)', legacy_message, params)
+        for name, strategy in (('md5', utils_message.MD5_ID), ('blake2b', utils_message.BLAKE2B_ID),
+                               ('uuid4', utils_message.RANDOM_ID)):
+            utils_message.set_id_strategy(strategy)
+            measure(f'один проход ({name})',
+                    lambda p: IncomingMessage.create('SERVICE', 'method', 'callback', p).to_bytes(), params)
+        utils_message.set_id_strategy(utils_message.MD5_ID)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+""" Бенчмарк памяти на обрабатываемое сообщение (tracemalloc): объекты со __slots__ и разбор без копирования.
+
+Запуск: python -m api_lib.tests.benchmarks.bench_message_memory
+"""
+import copy
+import json
+import tracemalloc
+
+from api_lib.utils.messages import IncomingMessage
+from api_lib.utils.validation_utils import InputParam
+
+MESSAGES = 10000
+PARAMS = 20
+
+
+class DictInputParam(object):
+    """ InputParam без __slots__ (как до изменения) """
+
+    def __init__(self, name: str, value):
+        self.name = name
+        self.value = value
+
+
+class DictIncomingMessage(object):
+    """ IncomingMessage без __slots__ с копированием словаря (как до изменения) """
+
+    def __init__(self, response_id, service_callback, params, method_callback, method=None):
+        self.params = params
+        self.service_callback = service_callback
+        self.id = response_id
+        self.method = method
+        self.method_callback = method_callback
+        self.additional_data = None
+
+    @staticmethod
+    def from_dict(message: dict):
+        params = copy.copy(message)
+        for name in ('id', 'method_callback', 'service_callback', 'method'):
+            del params[name]
+        return DictIncomingMessage(message['id'], message['service_callback'], params,
+                                   message['method_callback'], message['method'])
+
+
+def make_body() -> bytes:
+    message = {'id': 'a' * 32, 'method': 'method', 'method_callback': 'callback', 'service_callback': 'SERVICE'}
+    message.update({f'param{index}': f'value{index}' for index in range(PARAMS)})
+    return json.dumps(message).encode('utf-8')
+
+
+def measure(name: str, func, body: bytes):
+    r"""
+    Память на сообщение: удерживаемая объектами сообщения после разбора json
+    и пиковая при создании объектов из разобранного словаря (включая временные копии)
+    """
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    kept = [func(json.loads(body)) for _ in range(MESSAGES)]
+    retained = tracemalloc.get_traced_memory()[0] - base
+    del kept
+
+    peak_total = 0
+    for _ in range(MESSAGES):
+        data = json.loads(body)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            # Python 3.8: пик сбрасывается перезапуском трассировки
+            tracemalloc.stop()
+            tracemalloc.start()
+        start, _ = tracemalloc.get_traced_memory()
+        func(data)
+        del data
+        peak_total += tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    print(f'{name}: удерживается {retained / MESSAGES:,.0f} байт/сообщение, '
+          f'пик при создании {peak_total / MESSAGES:,.0f} байт/сообщение')
+
+
+def main():
+    body = make_body()
+    measure('IncomingMessage без __slots__, копия словаря', DictIncomingMessage.from_dict, body)
+    measure('IncomingMessage.from_owned_dict', IncomingMessage.from_owned_dict, body)
+    measure('InputParam без __slots__',
+            lambda params: [DictInputParam(name, value) for name, value in params.items()], body)
+    measure('InputParam.from_dict', InputParam.from_dict, body)
+
+
+if __name__ == '__main__':
+    main()
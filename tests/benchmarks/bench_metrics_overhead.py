@@ -0,0 +1,52 @@
+""" Бенчмарк накладных расходов метрик на обработку сообщения и отправку запроса.
+
+Запуск: python -m api_lib.tests.benchmarks.bench_metrics_overhead
+"""
+import time
+
+from api_lib.utils.metrics import ApiMetrics
+
+MESSAGES = 200000
+METHODS = {'method': None}
+
+
+def measure(name: str, func):
+    start = time.perf_counter()
+    for _ in range(MESSAGES):
+        func()
+    elapsed = (time.perf_counter() - start) / MESSAGES
+    print(f'  {name}: {elapsed * 1e6:.2f} мкс/сообщение')
+
+
+def main():
+    metrics = ApiMetrics()
+
+    def handler():
+        return None
+
+    def message():
+        method = metrics.method_label('method', METHODS)
+        started = metrics.message_started(method)
+        handler()
+        metrics.message_size.observe(1024, 'in', method)
+        metrics.message_finished(method, started)
+
+    def request():
+        with metrics.track_request('SERVICE', 'method', 'AMQP') as started:
+            handler()
+        metrics.callback_expected('id', 'SERVICE', 'method', started)
+        metrics.callback_received('id')
+
+    print('Входящее сообщение')
+    measure('без метрик', handler)
+    measure('с метриками', message)
+    print('Исходящий запрос с колбеком')
+    measure('с метриками', request)
+    print(f'p50/p95/p99 обработки: {[metrics.message_duration.quantile(q, "method") for q in (0.5, 0.95, 0.99)]}')
+    start = time.perf_counter()
+    metrics.render()
+    print(f'Формирование ответа /metrics: {(time.perf_counter() - start) * 1e3:.2f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+""" Бенчмарк поиска метода: find_method против скомпилированного индекса схемы.
+
+Запуск: python -m api_lib.tests.benchmarks.bench_schema_index
+"""
+import random
+import time
+
+from api_lib.utils.schema_index import SchemaIndex
+from api_lib.utils.validation_utils import find_method
+
+SERVICES = 500
+METHODS = 20
+LOOKUPS = 100000
+
+
+def make_schema() -> dict:
+    schema = {}
+    for service_index in range(SERVICES):
+        name = f'SERVICE{service_index}'
+        methods = {f'method{method_index}': {'guid': ['guid', 32, True], 'text': ['str', 256, False]}
+                   for method_index in range(METHODS)}
+        schema[name] = {
+            'AMQP': {
+                'config': {'address': '127.0.0.1', 'port': 5672, 'username': 'guest', 'password': 'guest',
+                           'exchange': name.lower(), 'quenue': name.lower(), 'virtualhost': '/', 'timeout': 30000},
+                'methods': {'write': methods},
+            }
+        }
+    return schema
+
+
+def measure(name: str, func, lookups):
+    start = time.perf_counter()
+    for service_name, method_name in lookups:
+        func(service_name, method_name)
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {len(lookups) / elapsed:,.0f} поисков/с')
+
+
+def main():
+    schema = make_schema()
+    lookups = [(f'SERVICE{random.randrange(SERVICES)}', f'method{random.randrange(METHODS)}')
+               for _ in range(LOOKUPS)]
+
+    start = time.perf_counter()
+    index = SchemaIndex(schema)
+    print(f'Компиляция схемы ({SERVICES} сервисов, {SERVICES * METHODS} методов): '
+          f'{time.perf_counter() - start:.3f} с')
+
+    measure('find_method', lambda service, method: find_method(method, schema[service]), lookups)
+    measure('SchemaIndex.get_method', index.get_method, lookups)
+
+
+if __name__ == '__main__':
+    main()
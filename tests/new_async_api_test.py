@@ -179,3 +179,28 @@ class TestCase(unittest.TestCase):
             self.assertTrue(callback_add_data['user_id'] == 123123)
 
         self.loop.run_until_complete(main())
+
+    def test_call(self):
+        """ Запрос с ожиданием ответа без редиса """
+
+        async def main():
+            callback_message = await self.api_sending.call(method_name='test_method',
+                                                           requested_service='CallbackService',
+                                                           params=[
+                                                               InputParam(name='test_str', value='123'),
+                                                               InputParam(name='guid',
+                                                                          value=str(uuid.uuid4())),
+                                                               InputParam(name='bin', value=b'123123'),
+                                                               InputParam(name='float',
+                                                                          value=3333.33),
+                                                               InputParam(name='int', value=3333),
+                                                               InputParam(name='bool', value=True),
+                                                               InputParam(name='base64',
+                                                                          value='base64=312fdvfbg2tgt'),
+                                                               InputParam(name='date',
+                                                                          value='2002-12-12T05:55:33±05:00'),
+                                                           ], timeout=5)
+            self.assertTrue(callback_message.result)
+            self.assertTrue(callback_message.response['key'] == 'value')
+
+        self.loop.run_until_complete(main())
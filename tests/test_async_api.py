@@ -0,0 +1,292 @@
+import asyncio
+import copy
+import json
+import unittest
+import unittest.mock
+from contextlib import asynccontextmanager
+
+from api_lib.async_api import ApiAsync, HTTP_DEFAULT_TIMEOUT
+from api_lib.tests.test_data import test_schema_rpc
+from api_lib.utils.callback_store import MemoryCallbackStore
+from api_lib.utils.middleware import Middleware, SEND
+from api_lib.utils.validation_utils import InputParam, MethodApi
+
+PARAMS = [
+    InputParam(name='test_str', value='123'),
+    InputParam(name='bin', value=b'123'),
+    InputParam(name='float', value=33.33),
+    InputParam(name='int', value=3333),
+    InputParam(name='bool', value=True),
+    InputParam(name='base64', value='base64=MTIz'),
+    InputParam(name='date', value='2002-12-12T05:55:33±05:00'),
+]
+
+
+class CallTestCase(unittest.TestCase):
+    """ call() без подключения к кролику: отправка подменяется """
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.api = ApiAsync('SendService', '', '', '', schema=copy.deepcopy(test_schema_rpc), is_test=False,
+                            callback_store=MemoryCallbackStore())
+        self.published = []
+
+    def tearDown(self):
+        self.loop.close()
+
+    def call(self, timeout: float = 1):
+        return self.api.call('test_method', PARAMS, 'CallbackService', timeout=timeout)
+
+    def test_publish_error(self):
+        async def publish(method, messages):
+            await asyncio.sleep(0.01)
+            raise ConnectionError
+
+        self.api._publish_amqp_messages = publish
+
+        async def run():
+            return await asyncio.gather(*[self.call() for _ in range(3)], return_exceptions=True)
+
+        results = self.loop.run_until_complete(run())
+        self.assertEqual([ConnectionError] * 3, [type(result) for result in results])
+        self.assertEqual({}, self.api._pending_calls)
+
+    def test_identical_calls(self):
+        """ Одинаковые запросы отправляются отдельно и получают свои ответы """
+        async def publish(method, messages):
+            self.published.extend(messages)
+
+        self.api._publish_amqp_messages = publish
+
+        async def run():
+            calls = [asyncio.ensure_future(self.call()) for _ in range(2)]
+            while len(self.published) < 2:
+                await asyncio.sleep(0)
+            for message in self.published:
+                self.api._pending_calls[message.id].set_result(message.id)
+            return await asyncio.gather(*calls)
+
+        results = self.loop.run_until_complete(run())
+        self.assertEqual([message.id for message in self.published], results)
+        self.assertNotEqual(results[0], results[1])
+        self.assertEqual({}, self.api._pending_calls)
+
+    def test_timeout(self):
+        async def publish(method, messages):
+            self.published.extend(messages)
+
+        self.api._publish_amqp_messages = publish
+        with self.assertRaises(asyncio.TimeoutError):
+            self.loop.run_until_complete(self.call(timeout=0.01))
+        self.assertEqual(1, len(self.published))
+        self.assertEqual({}, self.api._pending_calls)
+
+
+class Exchange(object):
+
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, message, routing_key):
+        self.published.append(message)
+
+
+class SendRecordMiddleware(Middleware):
+
+    def __init__(self):
+        self.contexts = []
+
+    def before(self, context):
+        self.contexts.append(context)
+
+
+class SendMiddlewareTestCase(unittest.TestCase):
+    """ Middleware отправки получает один запрос с одинаковыми аргументами (method, params) """
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.middleware = SendRecordMiddleware()
+        self.api = ApiAsync('SendService', '', '', '', schema=copy.deepcopy(test_schema_rpc), is_test=False,
+                            callback_store=MemoryCallbackStore(), middlewares=[self.middleware])
+        self.exchange = Exchange()
+
+        @asynccontextmanager
+        async def acquire_exchange(method):
+            yield self.exchange
+
+        self.api._acquire_exchange = acquire_exchange
+
+    def tearDown(self):
+        self.loop.close()
+
+    def assert_contexts(self, count: int):
+        self.assertEqual(count, len(self.middleware.contexts))
+        for context in self.middleware.contexts:
+            self.assertEqual((SEND, 'test_method', 'CallbackService'),
+                             (context.kind, context.method, context.service))
+            method, params = context.args
+            self.assertEqual('test_method', method.name)
+            self.assertEqual(PARAMS, params)
+
+    def test_send_request_api(self):
+        message_id = self.loop.run_until_complete(
+            self.api.send_request_api('test_method', PARAMS, 'CallbackService'))
+        self.assertEqual(1, len(self.exchange.published))
+        self.assert_contexts(1)
+        self.assertEqual(32, len(message_id))
+
+    def test_send_many_request_api(self):
+        message_ids = self.loop.run_until_complete(
+            self.api.send_many_request_api('test_method', [PARAMS, PARAMS], 'CallbackService'))
+        self.assertEqual(2, len(message_ids))
+        self.assertEqual(2, len(self.exchange.published))
+        self.assert_contexts(2)
+
+    def test_call(self):
+        async def run():
+            task = asyncio.ensure_future(self.api.call('test_method', PARAMS, 'CallbackService'))
+            while not self.api._pending_calls:
+                await asyncio.sleep(0)
+            future, = self.api._pending_calls.values()
+            future.set_result('answer')
+            return await task
+
+        self.assertEqual('answer', self.loop.run_until_complete(run()))
+        self.assert_contexts(1)
+
+
+class HttpSession(object):
+    """ Сессия aiohttp: запоминает параметры запроса """
+
+    def __init__(self):
+        self.requests = []
+
+    @asynccontextmanager
+    async def post(self, url, **kwargs):
+        self.requests.append(kwargs)
+        yield self
+
+    async def json(self):
+        return {}
+
+
+class HttpRequestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.api = ApiAsync('SendService', '', '', '', schema=copy.deepcopy(test_schema_rpc), is_test=False,
+                            callback_store=MemoryCallbackStore())
+        self.session = HttpSession()
+        self.api.get_http_session = lambda: self.session
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_default_timeout(self):
+        """ Без таймаута в схеме используется HTTP_DEFAULT_TIMEOUT, а не запрос без ограничения времени """
+        for timeout, expected in (('', HTTP_DEFAULT_TIMEOUT), (0, HTTP_DEFAULT_TIMEOUT), (5000, 5)):
+            method = MethodApi({}, 'HTTP', 'write', {
+                'address': 'localhost', 'auth': False, 'ssl': False, 'type': 'POST', 'endpoint': '/',
+                'username': '', 'password': '', 'timeout': timeout, 'port': 80}, 'test_method')
+            self.loop.run_until_complete(self.api.api_http_request(method, []))
+            self.assertEqual(expected, self.session.requests[-1]['timeout'].total)
+
+
+class QueueMessage(object):
+    """ Сообщение aio_pika: подтверждение при выходе из process() записывается в журнал """
+
+    def __init__(self, index: int, events: list):
+        self.index = index
+        self.events = events
+        self.body = json.dumps({'method': 'test_method', 'service_callback': 'SendService',
+                                'params': {'index': index}}).encode('utf-8')
+        self.content_encoding = None
+
+    @asynccontextmanager
+    async def process(self):
+        try:
+            yield self
+        except BaseException:
+            self.events.append(('reject', self.index))
+            raise
+        self.events.append(('ack', self.index))
+
+
+class Queue(object):
+
+    def __init__(self, messages: list):
+        self.messages = messages
+
+    @asynccontextmanager
+    async def iterator(self):
+        async def iterate():
+            for message in self.messages:
+                yield message
+
+        yield iterate()
+
+
+class Channel(object):
+
+    def __init__(self, queue: Queue):
+        self.queue = queue
+        self.prefetch_count = None
+
+    async def set_qos(self, prefetch_count: int):
+        self.prefetch_count = prefetch_count
+
+    async def get_queue(self, name: str):
+        return self.queue
+
+
+class ListenQueueConcurrencyTestCase(unittest.TestCase):
+    """ listen_queue(concurrency=N) без подключения к кролику: очередь и канал подменяются """
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.api = ApiAsync('CallbackService', '', '', '', schema=copy.deepcopy(test_schema_rpc), is_test=False,
+                            callback_store=MemoryCallbackStore())
+        self.events = []
+        self.channel = Channel(Queue([QueueMessage(index, self.events) for index in range(5)]))
+
+        async def make_connection():
+            connection = unittest.mock.Mock()
+            connection.channel = unittest.mock.AsyncMock(return_value=self.channel)
+            return connection
+
+        self.api.make_connection = make_connection
+        self.active = 0
+        self.max_active = 0
+
+        async def process_incoming_message(data: dict):
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.events.append(('start', data['params']['index']))
+            await asyncio.sleep(0.01)
+            self.events.append(('end', data['params']['index']))
+            self.active -= 1
+
+        self.api.process_incoming_message = process_incoming_message
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_concurrency(self):
+        self.loop.run_until_complete(self.api.listen_queue(concurrency=2))
+        self.assertEqual(2, self.channel.prefetch_count)
+        # Одновременно обрабатывается не больше concurrency сообщений, но больше одного
+        self.assertEqual(2, self.max_active)
+        self.assertEqual(5, self.api.processed_messages)
+        for index in range(5):
+            # Сообщение подтверждается после окончания обработки
+            self.assertLess(self.events.index(('end', index)), self.events.index(('ack', index)))
+        # Очередь закончилась раньше обработки: listen_queue дожидается сообщений в обработке
+        self.assertEqual(5, sum(1 for event, _ in self.events if event == 'ack'))
+
+    def test_prefetch_count(self):
+        self.loop.run_until_complete(self.api.listen_queue(concurrency=2, prefetch_count=10))
+        self.assertEqual(10, self.channel.prefetch_count)
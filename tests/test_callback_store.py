@@ -0,0 +1,45 @@
+import asyncio
+import time
+import unittest
+
+from api_lib.utils.callback_store import MemoryCallbackStore
+
+
+class MemoryCallbackStoreTestCase(unittest.TestCase):
+    loop = asyncio.new_event_loop()
+
+    def test_put_pop(self):
+        store = MemoryCallbackStore()
+        self.loop.run_until_complete(store.put('id', '{"method": "test"}', ttl=60))
+        self.assertEqual(b'{"method": "test"}', self.loop.run_until_complete(store.pop('id')))
+        # Состояние удаляется после получения
+        self.assertIsNone(self.loop.run_until_complete(store.pop('id')))
+        self.assertEqual(0, store.size)
+
+    def test_ttl(self):
+        store = MemoryCallbackStore()
+        self.loop.run_until_complete(store.put('id', 'value', ttl=0.01))
+        time.sleep(0.02)
+        self.assertIsNone(self.loop.run_until_complete(store.pop('id')))
+
+    def test_expire(self):
+        store = MemoryCallbackStore()
+        self.loop.run_until_complete(store.put('id', 'value', ttl=0.01))
+        self.assertTrue(self.loop.run_until_complete(store.expire('id', 60)))
+        time.sleep(0.02)
+        self.assertEqual(b'value', self.loop.run_until_complete(store.pop('id')))
+        self.assertFalse(self.loop.run_until_complete(store.expire('id', 60)))
+
+    def test_max_entries(self):
+        store = MemoryCallbackStore(max_entries=2)
+        self.loop.run_until_complete(store.put_many([('1', 'a'), ('2', 'b'), ('3', 'c')]))
+        self.assertEqual(2, len(store))
+        self.assertIsNone(self.loop.run_until_complete(store.pop('1')))
+        self.assertEqual(b'c', self.loop.run_until_complete(store.pop('3')))
+
+    def test_max_bytes(self):
+        store = MemoryCallbackStore(max_entries=None, max_bytes=10)
+        self.loop.run_until_complete(store.put_many([('1', '12345'), ('2', '12345'), ('3', '123')]))
+        self.assertLessEqual(store.size, 10)
+        self.assertIsNone(self.loop.run_until_complete(store.pop('1')))
+        self.assertEqual(b'12345', self.loop.run_until_complete(store.pop('2')))
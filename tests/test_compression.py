@@ -0,0 +1,60 @@
+import json
+import unittest
+import zlib
+from unittest import mock
+
+from api_lib.utils import compression
+from api_lib.utils.compression import Compression, compress, decompress
+from api_lib.utils.custom_exceptions import DecompressedSizeExceeded, UnknownContentEncoding
+
+BODY = json.dumps({'method': 'test_method', 'base64': 'base64=' + 'A' * 200000}).encode('utf-8')
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_threshold(self):
+        body, content_encoding = Compression(threshold=len(BODY) + 1).compress(BODY)
+        self.assertIs(BODY, body)
+        self.assertIsNone(content_encoding)
+        self.assertEqual((BODY, None), compress(BODY, None))
+
+    def test_round_trip(self):
+        for algorithm in compression.CODECS:
+            body, content_encoding = Compression(algorithm, threshold=1024).compress(BODY)
+            self.assertEqual(algorithm, content_encoding)
+            self.assertLess(len(body), len(BODY))
+            self.assertEqual(BODY, decompress(body, content_encoding))
+
+    def test_max_size(self):
+        # Маленькое сжатое сообщение не распаковывается сверх ограничения
+        bomb = b'0' * (10 * 1024 * 1024)
+        for algorithm in compression.CODECS:
+            body, content_encoding = Compression(algorithm, threshold=0).compress(bomb)
+            self.assertLess(len(body), 64 * 1024)
+            with self.assertRaises(DecompressedSizeExceeded):
+                decompress(body, content_encoding, max_size=1024 * 1024)
+            self.assertEqual(bomb, decompress(body, content_encoding, max_size=len(bomb)))
+
+    def test_truncated(self):
+        body, content_encoding = Compression(threshold=0).compress(BODY)
+        with self.assertRaises(zlib.error):
+            decompress(body[:-10], content_encoding)
+
+    def test_zlib_alias(self):
+        self.assertEqual('deflate', Compression('zlib').codec.content_encoding)
+
+    def test_not_compressed(self):
+        self.assertIs(BODY, decompress(BODY, None))
+        self.assertIs(BODY, decompress(BODY, 'identity'))
+        # content_encoding других отправителей (кодировка, чужие алгоритмы) не распаковывается
+        for content_encoding in ('utf-8', 'UTF-8', 'gzip', 'br'):
+            self.assertIs(BODY, decompress(BODY, content_encoding))
+
+    def test_unknown(self):
+        with self.assertRaises(UnknownContentEncoding):
+            Compression('br')
+        # Алгоритм библиотеки без установленного пакета
+        with mock.patch.dict(compression.CODECS):
+            compression.CODECS.pop('lz4', None)
+            with self.assertRaises(UnknownContentEncoding):
+                decompress(BODY, 'lz4')
@@ -0,0 +1,91 @@
+import json
+import unittest
+
+from api_lib.tests.test_data import test_schema_rpc
+from api_lib.utils import framing
+from api_lib.utils.custom_exceptions import FrameError, WrongTypeParam
+from api_lib.utils.schema_index import SchemaIndex
+from api_lib.utils.validation_utils import InputParam
+
+BINARY = bytes(range(256)) * 100
+
+
+class TestFraming(unittest.TestCase):
+
+    def test_round_trip(self):
+        message_json = json.dumps({'method': 'test_method', 'id': '1'})
+        body = framing.encode_frame(message_json, {'bin': BINARY, 'empty': b''})
+        self.assertTrue(framing.is_frame(body))
+        message = framing.loads_message(body)
+        self.assertEqual('test_method', message['method'])
+        self.assertIsInstance(message['bin'], memoryview)
+        self.assertEqual(BINARY, message['bin'])
+        self.assertEqual(b'', message['empty'])
+
+    def test_json_message(self):
+        body = json.dumps({'method': 'test_method'}).encode('utf-8')
+        self.assertFalse(framing.is_frame(body))
+        self.assertEqual({'method': 'test_method'}, framing.loads_message(body))
+
+    def test_truncated(self):
+        body = framing.encode_frame('{}', {'bin': BINARY})
+        with self.assertRaises(FrameError):
+            framing.decode_frame(body[:-1])
+
+
+class TestBinaryTransport(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.method = SchemaIndex(test_schema_rpc).get_method('CallbackService', 'test_method')
+        self.params = [
+            InputParam(name='test_str', value='123'),
+            InputParam(name='bin', value=b'123123'),
+            InputParam(name='float', value=3333.33),
+            InputParam(name='int', value=3333),
+            InputParam(name='bool', value=True),
+            InputParam(name='base64', value=BINARY),
+            InputParam(name='date', value='2002-12-12T05:55:33±05:00'),
+        ]
+
+    def test_binary_message(self):
+        message = self.method.get_message_amqp(self.params, 'SendService', 'callback', binary_transport=True)
+        data = framing.loads_message(message.to_bytes())
+        self.assertEqual(message.id, data['id'])
+        self.assertEqual(BINARY, data['base64'])
+        self.assertEqual(b'123123', data['bin'])
+        # Входящее сообщение в бинарном формате проходит проверку параметров
+        self.method.check_params_dict({name: value for name, value in data.items()
+                                       if name not in ('id', 'method', 'method_callback', 'service_callback')})
+        # json представление (для хранения состояния колбека) содержит base64
+        self.assertEqual(framing.to_base64(BINARY), json.loads(message.json())['base64'])
+
+    def test_legacy_message(self):
+        # Без binary_transport байты bin передаются как раньше: текстом в utf-8, без кодирования в base64
+        params = [param for param in self.params if param.name != 'base64']
+        params.append(InputParam(name='base64', value='base64=MTIz'))
+        message = self.method.get_message_amqp(params, 'SendService', 'callback')
+        body = message.to_bytes()
+        self.assertFalse(framing.is_frame(body))
+        data = json.loads(body)
+        self.assertEqual('base64=MTIz', data['base64'])
+        self.assertEqual('123123', data['bin'])
+
+    def test_legacy_binary_base64(self):
+        # Без binary_transport параметр base64 - только строка, бинарный формат не отправляется
+        params = [param for param in self.params if param.name != 'base64']
+        for value in (memoryview(BINARY), bytearray(BINARY), BINARY):
+            with self.assertRaises(WrongTypeParam):
+                self.method.get_message_amqp(params + [InputParam(name='base64', value=value)],
+                                             'SendService', 'callback')
+        params.append(InputParam(name='base64', value='base64=MTIz'))
+        params[1] = InputParam(name='bin', value=memoryview(b'123123'))
+        body = self.method.get_message_amqp(params, 'SendService', 'callback').to_bytes()
+        self.assertFalse(framing.is_frame(body))
+        self.assertEqual('123123', json.loads(body)['bin'])
+
+    def test_multipart(self):
+        fields, files = self.method.get_message_http_multipart(self.params)
+        self.assertEqual({'bin', 'base64'}, set(files))
+        # Поля multipart только строки: aiohttp.FormData не принимает int, float и bool
+        self.assertEqual({'test_str': '123', 'float': '3333.33', 'int': '3333', 'bool': 'True',
+                          'date': '2002-12-12T05:55:33±05:00'}, fields)
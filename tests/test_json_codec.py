@@ -0,0 +1,97 @@
+import datetime
+import hashlib
+import json
+import unittest
+
+from api_lib.utils import utils_message
+from api_lib.utils.messages import IncomingMessage
+from api_lib.utils.utils_message import JsonCodec, orjson
+
+MESSAGE = {
+    'method': 'test_method',
+    'service_callback': 'Сервис',
+    'params': {'date': datetime.datetime(2022, 1, 2, 3, 4, 5), 'float': 0.1, 'list': [1, None, True]},
+    'id': 'abc',
+}
+
+
+class TestJsonCodec(unittest.TestCase):
+
+    def test_dumps_compatible(self):
+        expected = json.dumps(MESSAGE, ensure_ascii=True, default=str)
+        self.assertEqual(expected, JsonCodec().dumps(MESSAGE))
+        self.assertEqual(expected, utils_message.serialize_message(MESSAGE))
+        self.assertEqual(hashlib.md5(expected.encode('utf-8')).hexdigest(), utils_message.create_hash(MESSAGE))
+
+    def test_loads(self):
+        body = json.dumps(MESSAGE, ensure_ascii=False, default=str).encode('utf-8')
+        self.assertEqual(json.loads(body), utils_message.loads(body))
+        self.assertEqual(json.loads(body), utils_message.loads(body.decode('utf-8')))
+        with self.assertRaises(json.JSONDecodeError):
+            utils_message.loads(b'{"id": ')
+
+
+@unittest.skipIf(orjson is None, 'orjson не установлен')
+class TestOrjsonCodec(unittest.TestCase):
+
+    def test_loads_fallback(self):
+        codec = utils_message.OrjsonCodec()
+        data = codec.loads(b'{"nan": NaN, "big": 123456789012345678901234567890}')
+        self.assertEqual(123456789012345678901234567890, data['big'])
+
+    def test_fast_dumps(self):
+        codec = utils_message.OrjsonCodec(fast_dumps=True)
+        expected = json.loads(json.dumps(MESSAGE, default=str))
+        self.assertEqual(expected, json.loads(codec.dumps_bytes(MESSAGE)))
+        self.assertEqual(expected, json.loads(codec.dumps(MESSAGE)))
+
+
+class TestMessageId(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        utils_message.set_id_strategy(utils_message.MD5_ID)
+
+    def test_serialize_with_id(self):
+        message = {key: value for key, value in MESSAGE.items() if key != 'id'}
+        body, message_id = utils_message.serialize_with_id(message)
+        expected = json.dumps({**message, 'id': utils_message.create_hash(message)}, ensure_ascii=True, default=str)
+        self.assertEqual(expected, body)
+        self.assertEqual(json.loads(body)['id'], message_id)
+
+    def test_strategies(self):
+        utils_message.set_id_strategy(utils_message.BLAKE2B_ID)
+        _, first_id = utils_message.serialize_with_id(MESSAGE)
+        _, second_id = utils_message.serialize_with_id(MESSAGE)
+        self.assertEqual(first_id, second_id)
+        self.assertEqual(32, len(first_id))
+
+        utils_message.set_id_strategy(utils_message.RANDOM_ID)
+        _, first_id = utils_message.serialize_with_id(MESSAGE)
+        _, second_id = utils_message.serialize_with_id(MESSAGE)
+        self.assertNotEqual(first_id, second_id)
+
+    def test_incoming_message(self):
+        message = IncomingMessage.create('Service', 'method', 'callback', {'param': 'значение'})
+        data = json.loads(message.json())
+        self.assertEqual(message.id, data['id'])
+        self.assertEqual(message.json(), IncomingMessage.from_dict(data).json())
+        self.assertEqual({'a': 1}, json.loads(message.json(additional_data={'a': 1}))['additional_data'])
+        message.recheck_message(datetime.datetime(2022, 1, 1))
+        self.assertIn('recheck_date', json.loads(message.json()))
+
+    def test_incoming_message_changed(self):
+        message = IncomingMessage.create('Service', 'method', 'callback', {'a': 1})
+        message.json()
+        message.params['a'] = 2
+        message.method_callback = 'other_callback'
+        data = json.loads(message.json())
+        self.assertEqual(2, data['a'])
+        self.assertEqual('other_callback', data['method_callback'])
+
+    def test_additional_data_replaced(self):
+        # Состояние колбека из редиса содержит additional_data в параметрах
+        state = {'method': 'method', 'service_callback': 'Service', 'method_callback': 'callback',
+                 'param': 1, 'id': '1', 'additional_data': {'a': 1}}
+        body = IncomingMessage.from_dict(state).json(additional_data={'a': 2})
+        self.assertEqual(1, body.count('"additional_data"'))
+        self.assertEqual({'a': 2}, json.loads(body)['additional_data'])
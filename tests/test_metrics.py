@@ -0,0 +1,83 @@
+import unittest
+import urllib.error
+import urllib.request
+
+from api_lib.utils.metrics import ApiMetrics, Histogram, UNKNOWN_METHOD
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_quantiles(self):
+        histogram = Histogram('duration', 'test', ('method',), buckets=(1, 2, 3, 4))
+        for value in (0.5, 1.5, 2.5, 3.5) * 25:
+            histogram.observe(value, 'test_method')
+        self.assertEqual(100, histogram.count('test_method'))
+        self.assertAlmostEqual(2, histogram.quantile(0.5, 'test_method'))
+        self.assertAlmostEqual(3.8, histogram.quantile(0.95, 'test_method'))
+        self.assertIsNone(histogram.quantile(0.5, 'other_method'))
+
+    def test_overflow_bucket(self):
+        histogram = Histogram('duration', 'test', buckets=(1,))
+        histogram.observe(10)
+        self.assertEqual(1, histogram.quantile(0.99))
+
+
+class TestApiMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = ApiMetrics()
+
+    def test_method_label(self):
+        methods = {'test_method': None}
+        self.assertEqual('test_method', self.metrics.method_label('test_method', methods))
+        self.assertEqual(UNKNOWN_METHOD, self.metrics.method_label('random_name', methods))
+        self.assertEqual(UNKNOWN_METHOD, self.metrics.method_label(None, None))
+
+    def test_message(self):
+        started = self.metrics.message_started('test_method')
+        self.assertEqual(1, self.metrics.messages_in_flight.get('test_method'))
+        self.metrics.message_finished('test_method', started, error=True)
+        self.assertEqual(0, self.metrics.messages_in_flight.get('test_method'))
+        self.assertEqual(1, self.metrics.messages.get('test_method'))
+        self.assertEqual(1, self.metrics.message_errors.get('test_method'))
+        self.assertEqual(1, self.metrics.message_duration.count('test_method'))
+
+    def test_track_request(self):
+        labels = ('SERVICE', 'test_method', 'AMQP')
+        with self.metrics.track_request(*labels, count=3):
+            pass
+        with self.assertRaises(ValueError):
+            with self.metrics.track_request(*labels):
+                raise ValueError
+        self.assertEqual(4, self.metrics.requests.get(*labels))
+        self.assertEqual(1, self.metrics.request_errors.get(*labels))
+        self.assertEqual(2, self.metrics.request_duration.count(*labels))
+
+    def test_callback_roundtrip(self):
+        self.metrics.callback_expected('id', 'SERVICE', 'test_method')
+        self.metrics.callback_received('id')
+        self.metrics.callback_received('id')
+        self.metrics.callback_received('unknown_id')
+        self.assertEqual(1, self.metrics.callback_roundtrip.count('SERVICE', 'test_method'))
+
+    def test_render(self):
+        self.metrics.messages.inc('method "quoted"')
+        self.metrics.message_size.observe(100, 'in', 'test_method')
+        text = self.metrics.render()
+        self.assertIn('# TYPE api_messages_total counter', text)
+        self.assertIn('api_messages_total{method="method \\"quoted\\""} 1', text)
+        self.assertIn('api_message_size_bytes_bucket{direction="in",method="test_method",le="256"} 1', text)
+        self.assertIn('api_message_size_bytes_bucket{direction="in",method="test_method",le="+Inf"} 1', text)
+        self.assertIn('api_message_size_bytes_count{direction="in",method="test_method"} 1', text)
+
+    def test_http_server(self):
+        self.metrics.messages.inc('test_method')
+        server = self.metrics.start_http_server(0)
+        try:
+            url = f'http://127.0.0.1:{server.server_port}'
+            with urllib.request.urlopen(f'{url}/metrics') as response:
+                self.assertIn(b'api_messages_total{method="test_method"} 1', response.read())
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f'{url}/other')
+        finally:
+            self.metrics.stop_http_server()
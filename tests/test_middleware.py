@@ -0,0 +1,132 @@
+import asyncio
+import os
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+
+from api_lib.utils import middleware
+from api_lib.utils.middleware import (Middleware, MiddlewareChain, MESSAGE, ProfileMiddleware, TimingMiddleware,
+                                      TracemallocMiddleware)
+
+
+class RecordMiddleware(Middleware):
+
+    def __init__(self, name: str, calls: list):
+        self.name = name
+        self.calls = calls
+
+    def before(self, context):
+        self.calls.append((self.name, 'before', context.method, context.args))
+
+    def after(self, context, result):
+        self.calls.append((self.name, 'after', result))
+
+    def on_error(self, context, error):
+        self.calls.append((self.name, 'on_error', type(error)))
+
+
+class AsyncRecordMiddleware(RecordMiddleware):
+
+    async def after(self, context, result):
+        await asyncio.sleep(0)
+        super().after(context, result)
+
+
+class TestMiddlewareChain(unittest.TestCase):
+
+    def test_without_middlewares(self):
+        self.assertEqual(3, MiddlewareChain().call(MESSAGE, 'test_method', 'SERVICE', lambda a, b: a + b, 1, 2))
+
+    def test_order(self):
+        calls = []
+        chain = MiddlewareChain([RecordMiddleware('first', calls), RecordMiddleware('second', calls)])
+        self.assertEqual(3, chain.call(MESSAGE, 'test_method', 'SERVICE', lambda a, b: a + b, 1, 2))
+        self.assertEqual([('first', 'before', 'test_method', (1, 2)),
+                          ('second', 'before', 'test_method', (1, 2)),
+                          ('second', 'after', 3),
+                          ('first', 'after', 3)], calls)
+
+    def test_error(self):
+        calls = []
+        chain = MiddlewareChain([RecordMiddleware('first', calls)])
+        with self.assertRaises(ZeroDivisionError):
+            chain.call(MESSAGE, 'test_method', 'SERVICE', lambda: 1 / 0)
+        self.assertEqual(('first', 'on_error', ZeroDivisionError), calls[-1])
+
+    def test_before_error(self):
+        calls = []
+
+        class FailingMiddleware(Middleware):
+            def before(self, context):
+                raise RuntimeError
+
+        chain = MiddlewareChain([RecordMiddleware('first', calls), FailingMiddleware(),
+                                 RecordMiddleware('third', calls)])
+        with self.assertRaises(RuntimeError):
+            chain.call(MESSAGE, 'test_method', 'SERVICE', lambda: None)
+        self.assertEqual([('first', 'before', 'test_method', ()), ('first', 'on_error', RuntimeError)], calls)
+
+    def test_async(self):
+        calls = []
+        chain = MiddlewareChain([RecordMiddleware('first', calls), AsyncRecordMiddleware('second', calls)])
+
+        async def handler(value):
+            return value
+
+        self.assertEqual('result', asyncio.run(chain.acall(MESSAGE, 'test_method', 'SERVICE', handler, 'result')))
+        self.assertEqual([('second', 'after', 'result'), ('first', 'after', 'result')], calls[2:])
+
+
+class ContextMiddleware(Middleware):
+    """ Сохраняет контекст последнего вызова """
+
+    def before(self, context):
+        self.context = context
+
+
+class TestMiddlewares(unittest.TestCase):
+
+    def test_timing(self):
+        spy = ContextMiddleware()
+        MiddlewareChain([spy, TimingMiddleware(threshold=60)]).call(MESSAGE, 'test_method', 'SERVICE', lambda: None)
+        self.assertGreaterEqual(spy.context.state['duration'], 0)
+
+    def test_tracemalloc(self):
+        spy = ContextMiddleware()
+        chain = MiddlewareChain([spy, TracemallocMiddleware(threshold=1 << 40)])
+        chain.call(MESSAGE, 'test_method', 'SERVICE', lambda: bytearray(1024 * 1024))
+        self.assertGreaterEqual(spy.context.state['memory_peak'], 1024 * 1024)
+
+    def test_tracemalloc_without_reset_peak(self):
+        # Python 3.8: tracemalloc.reset_peak отсутствует, записывается прирост памяти
+        spy = ContextMiddleware()
+        chain = MiddlewareChain([spy, TracemallocMiddleware(threshold=1 << 40)])
+        with mock.patch.object(middleware, '_HAS_RESET_PEAK', False), \
+                mock.patch.object(tracemalloc, 'reset_peak', side_effect=AttributeError, create=True):
+            chain.call(MESSAGE, 'test_method', 'SERVICE', lambda: bytearray(1024 * 1024))
+        self.assertGreaterEqual(spy.context.state['memory_peak'], 1024 * 1024)
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            chain = MiddlewareChain([ProfileMiddleware(threshold=0, output_dir=output_dir)])
+            chain.call(MESSAGE, 'test_method', 'SERVICE', sum, range(1000))
+            chain.call(MESSAGE, 'test_method', 'SERVICE', sum, range(1000))
+            with self.assertRaises(ZeroDivisionError):
+                chain.call(MESSAGE, 'other_method', 'SERVICE', lambda: 1 / 0)
+            # Профили одного метода в одну секунду не перезаписываются
+            self.assertEqual(3, len(os.listdir(output_dir)))
+
+    def test_profile_released_on_before_error(self):
+        class FailingMiddleware(Middleware):
+            def before(self, context):
+                raise RuntimeError
+
+        profile = ProfileMiddleware(threshold=60)
+        with self.assertRaises(RuntimeError):
+            MiddlewareChain([profile, FailingMiddleware()]).call(MESSAGE, 'test_method', 'SERVICE', lambda: None)
+        # Профилировщик выключен и следующий вызов профилируется
+        spy = ContextMiddleware()
+        MiddlewareChain([spy, profile]).call(MESSAGE, 'test_method', 'SERVICE', lambda: None)
+        self.assertNotIn('profiler', spy.context.state)
+        self.assertFalse(profile._lock.locked())
@@ -0,0 +1,93 @@
+import asyncio
+import copy
+import json
+import os
+import tempfile
+import unittest
+
+from api_lib.async_api import ApiAsync
+from api_lib.tests.test_data import test_schema_rpc
+from api_lib.utils.callback_store import MemoryCallbackStore
+from api_lib.utils.custom_exceptions import SchemaLoadFailed
+from api_lib.utils.schema_cache import SchemaCache
+
+
+class SchemaCacheTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'schema', 'cache.json')
+        self.content = json.dumps(test_schema_rpc).encode('utf-8')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_save_load(self):
+        SchemaCache(self.path).save(self.content, etag='"v1"')
+        cache = SchemaCache(self.path)
+        self.assertEqual(test_schema_rpc, cache.load())
+        self.assertEqual({'If-None-Match': '"v1"'}, cache.conditional_headers())
+        self.assertFalse(cache.is_changed(self.content))
+        self.assertTrue(cache.is_changed(self.content + b' '))
+
+    def test_missing(self):
+        cache = SchemaCache(self.path)
+        self.assertIsNone(cache.load())
+        self.assertEqual({}, cache.conditional_headers())
+
+    def test_corrupted(self):
+        SchemaCache(self.path).save(self.content)
+        with open(self.path, 'ab') as file:
+            file.write(b'garbage')
+        self.assertIsNone(SchemaCache(self.path).load())
+
+
+class ApiSchemaCacheTestCase(unittest.TestCase):
+    """ В кеш записывается только ответ сервера апи 200 с json """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.json')
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.api = ApiAsync('SendService', '', '', '', is_test=False, callback_store=MemoryCallbackStore(),
+                            schema_cache_path=self.path)
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        self.directory.cleanup()
+
+    def fetch(self, status: int, content: bytes):
+        async def fetch_schema(headers: dict = None):
+            return status, content, None
+
+        self.api._fetch_schema = fetch_schema
+
+    def test_error_status(self):
+        self.fetch(502, b'{"error": "Bad Gateway"}')
+        with self.assertRaises(SchemaLoadFailed):
+            self.loop.run_until_complete(self.api.get_schema())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_not_json(self):
+        self.fetch(200, b'<html>error</html>')
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(self.api.get_schema())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(self.loop.run_until_complete(self.api.revalidate_schema()))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_saved(self):
+        content = json.dumps(test_schema_rpc).encode('utf-8')
+        self.fetch(200, content)
+        self.assertEqual(test_schema_rpc, self.loop.run_until_complete(self.api.get_schema()))
+        self.assertEqual(test_schema_rpc, SchemaCache(self.path).load())
+
+    def test_refresh_service_params(self):
+        """ Изменение описания текущего сервиса применяется к параметрам подключения (как в ApiSync) """
+        self.api.set_schema(test_schema_rpc)
+        self.assertEqual('sendQueue', self.api.queue)
+        schema = copy.deepcopy(test_schema_rpc)
+        schema['SendService']['AMQP']['config']['quenue'] = 'newQueue'
+        self.assertTrue(self.loop.run_until_complete(self.api.refresh_schema(schema)))
+        self.assertEqual('newQueue', self.api.queue)
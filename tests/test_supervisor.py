@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+from api_lib.supervisor import Supervisor
+
+
+class FakeApi(object):
+    """ ApiSync без подключения: listen_queue падает или ждет остановки, события пишутся в файл """
+
+    def __init__(self, path: str, crash: bool):
+        self.path = path
+        self.crash = crash
+        self.processed_messages = 0
+        self.write('started')
+
+    def write(self, event: str):
+        with open(self.path, 'a') as file:
+            file.write(f'{event} {os.getpid()}\n')
+
+    def listen_queue(self, workers: int = None):
+        self.write(f'listen workers={workers}')
+        if self.crash:
+            raise RuntimeError('crash')
+        while True:
+            time.sleep(0.1)
+
+    def close(self):
+        self.write('closed')
+
+
+def read_events(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return [line.split()[0] for line in file]
+
+
+def wait_for(condition, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class SupervisorTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'events')
+        self.handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)}
+
+    def tearDown(self) -> None:
+        for signum, handler in self.handlers.items():
+            signal.signal(signum, handler)
+        self.directory.cleanup()
+
+    def supervisor(self, crash: bool) -> Supervisor:
+        return Supervisor(lambda: FakeApi(self.path, crash), workers=1, restart_delay=0.1, stop_timeout=5)
+
+    def test_restart_crashed(self):
+        supervisor = self.supervisor(crash=True)
+        watcher = threading.Thread(
+            target=lambda: (wait_for(lambda: read_events(self.path).count('started') >= 3), supervisor.stop()))
+        watcher.start()
+        supervisor.run()
+        watcher.join()
+        self.assertGreaterEqual(read_events(self.path).count('started'), 3)
+        # Упавший обработчик закрывает подключение перед перезапуском
+        self.assertGreaterEqual(read_events(self.path).count('closed'), 2)
+
+    def test_sigterm_shutdown(self):
+        """ SIGTERM супервизору: обработчики закрывают подключение, супервизор завершается """
+        process = multiprocessing.get_context('fork').Process(target=self.supervisor(crash=False).run)
+        process.start()
+        try:
+            self.assertTrue(wait_for(lambda: 'listen' in read_events(self.path)))
+            os.kill(process.pid, signal.SIGTERM)
+            process.join(10)
+            self.assertEqual(0, process.exitcode)
+        finally:
+            if process.is_alive():
+                process.kill()
+        self.assertEqual(['started', 'listen', 'closed'], read_events(self.path))
+        # ApiSync слушает очередь с подтверждением после обработки
+        with open(self.path) as file:
+            self.assertIn('workers=1', file.read())
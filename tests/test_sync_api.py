@@ -0,0 +1,155 @@
+import json
+import types
+import unittest
+
+import pika.exceptions
+
+from api_lib.sync_api import ApiSync
+from api_lib.tests.test_data import test_schema_rpc
+
+
+class FakeChannel(object):
+    """ Канал pika: доставляет сообщения и останавливается, как при KeyboardInterrupt/SIGTERM """
+
+    def __init__(self, messages: int):
+        self.messages = messages
+        self.acked = []
+        self.on_message_callback = None
+
+    def basic_qos(self, prefetch_count: int):
+        pass
+
+    def basic_consume(self, on_message_callback, queue: str):
+        self.on_message_callback = on_message_callback
+
+    def start_consuming(self):
+        props = types.SimpleNamespace(content_encoding=None)
+        for delivery_tag in range(1, self.messages + 1):
+            self.on_message_callback(self, types.SimpleNamespace(delivery_tag=delivery_tag), props, b'{}')
+        raise KeyboardInterrupt
+
+    def basic_ack(self, delivery_tag: int):
+        self.acked.append(delivery_tag)
+
+
+class FakeConnection(object):
+
+    def __init__(self, channel: FakeChannel):
+        self._channel = channel
+        self.callbacks = []
+        self.is_open = True
+
+    def channel(self):
+        return self._channel
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.append(callback)
+
+    def process_data_events(self, time_limit: float = None):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def close(self):
+        self.is_open = False
+
+
+class ListenQueuePoolTestCase(unittest.TestCase):
+
+    def test_ack_on_stop(self):
+        """ Сообщения, обработанные до остановки, подтверждаются перед закрытием подключения """
+        api = ApiSync('CallbackService', schema=test_schema_rpc, user_api='test', pass_api='test', is_test=False,
+                      methods={'test_method': lambda **kwargs: ({}, True)})
+        channel = FakeChannel(messages=3)
+        connection = FakeConnection(channel)
+        api._open_amqp_connection_current_service = lambda: connection
+        with self.assertRaises(KeyboardInterrupt):
+            api.listen_queue(workers=2)
+        self.assertEqual([1, 2, 3], sorted(channel.acked))
+        self.assertEqual(3, api.processed_messages)
+        self.assertFalse(connection.is_open)
+
+
+class ProcessBodyTestCase(unittest.TestCase):
+
+    def test_charset_content_encoding(self):
+        """ content_encoding с кодировкой от других отправителей не считается сжатием """
+        api = ApiSync('CallbackService', schema=test_schema_rpc, user_api='test', pass_api='test', is_test=False,
+                      methods={'test_method': lambda **kwargs: ({}, True)})
+        api.process_incoming_message = lambda data: 'reply'
+        body = json.dumps({'method': 'test_method', 'service_callback': 'SendService', 'params': {}}).encode('utf-8')
+        route, reply = api._process_body(body, 'utf-8')
+        self.assertEqual('sendQueue', route.queue)
+        self.assertEqual(b'reply', reply)
+
+
+class PublishChannel(object):
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.is_closed = False
+        self.published = []
+
+    def basic_publish(self, exchange: str, routing_key: str, body: bytes, properties=None):
+        if self.fail:
+            raise pika.exceptions.AMQPConnectionError('connection lost')
+        self.published.append(body)
+
+
+class PublishConnection(object):
+
+    def __init__(self, channel: PublishChannel):
+        self._channel = channel
+        self.is_closed = False
+        self.events_processed = 0
+
+    @property
+    def is_open(self):
+        return not self.is_closed
+
+    def channel(self):
+        return self._channel
+
+    def process_data_events(self, time_limit: float = None):
+        self.events_processed += 1
+
+    def close(self):
+        self.is_closed = True
+
+
+class PublishConnectionTestCase(unittest.TestCase):
+    """ Переиспользуемое подключение для отправки сообщений """
+
+    def setUp(self) -> None:
+        self.api = ApiSync('SendService', schema=test_schema_rpc, user_api='test', pass_api='test', is_test=False)
+        self.connections = []
+        self.channels = [PublishChannel()]
+        self.api._open_amqp_connection_current_service = self.open_connection
+
+    def open_connection(self):
+        connection = PublishConnection(self.channels[len(self.connections)])
+        self.connections.append(connection)
+        return connection
+
+    def test_reuse(self):
+        for _ in range(3):
+            self.api._publish('exchange', 'routing_key', b'body')
+        self.assertEqual(1, len(self.connections))
+        self.assertEqual([b'body'] * 3, self.channels[0].published)
+        # Heartbeat-кадры обрабатываются при повторном использовании подключения
+        self.assertEqual(2, self.connections[0].events_processed)
+
+    def test_reconnect(self):
+        self.channels = [PublishChannel(fail=True), PublishChannel()]
+        self.api._publish('exchange', 'routing_key', b'body')
+        self.assertEqual(2, len(self.connections))
+        self.assertTrue(self.connections[0].is_closed)
+        self.assertEqual([b'body'], self.channels[1].published)
+        self.api._publish('exchange', 'routing_key', b'body')
+        self.assertEqual(2, len(self.connections))
+
+    def test_reconnect_once(self):
+        self.channels = [PublishChannel(fail=True), PublishChannel(fail=True)]
+        with self.assertRaises(pika.exceptions.AMQPConnectionError):
+            self.api._publish('exchange', 'routing_key', b'body')
+        self.assertEqual(2, len(self.connections))
@@ -0,0 +1,101 @@
+import unittest
+import uuid
+
+from api_lib.tests.test_data import test_schema_rpc
+from api_lib.utils.custom_exceptions import WrongTypeParam, WrongSizeParam, ParamNotFound, RequireParamNotSet
+from api_lib.utils.rabbit_utils import check_params_amqp
+from api_lib.utils.validation_utils import Param, find_method
+
+
+class TestParamValidators(unittest.TestCase):
+
+    def test_str(self):
+        param = Param('str', 3, True, 'name')
+        param.check_value('abc')
+        self.assertRaises(WrongSizeParam, param.check_value, 'abcd')
+        self.assertRaises(WrongTypeParam, param.check_value, 123)
+
+    def test_int(self):
+        param = Param('int', 2, True, 'name')
+        param.check_value(99)
+        self.assertRaises(WrongSizeParam, param.check_value, 100)
+        self.assertRaises(WrongTypeParam, param.check_value, '1')
+
+    def test_float(self):
+        param = Param('float', '3.2', True, 'name')
+        param.check_value(123.45)
+        self.assertRaises(WrongSizeParam, param.check_value, 1234.5)
+        self.assertRaises(WrongSizeParam, param.check_value, 1.234)
+        self.assertRaises(WrongTypeParam, param.check_value, 1)
+
+    def test_guid_date_bool(self):
+        Param('guid', 32, True, 'name').check_value(str(uuid.uuid4()))
+        self.assertRaises(WrongTypeParam, Param('guid', 32, True, 'name').check_value, '123')
+        Param('date', None, True, 'name').check_value('2002-12-12T05:55:33±05:00')
+        self.assertRaises(WrongTypeParam, Param('date', None, True, 'name').check_value, '2002-12-12')
+        self.assertRaises(WrongTypeParam, Param('date', None, True, 'name').check_value, None)
+        self.assertRaises(WrongTypeParam, Param('bool', None, True, 'name').check_value, 1)
+
+    def test_config_timeout(self):
+        method = find_method('test_method', test_schema_rpc['CallbackService'])
+        # В схеме таймаут в миллисекундах
+        self.assertEqual(30, method.config.get_timeout_seconds())
+        method.config.timeout = ''
+        self.assertIsNone(method.config.get_timeout_seconds())
+        method.config.timeout = 0
+        self.assertIsNone(method.config.get_timeout_seconds())
+
+    def test_check_params_dict(self):
+        method = find_method('test_method', test_schema_rpc['CallbackService'])
+        params = {
+            'test_str': '123',
+            'bin': '123123',
+            'float': 3333.33,
+            'int': 3333,
+            'bool': True,
+            'base64': 'base64=312fdvfbg2tgt',
+            'date': '2002-12-12T05:55:33±05:00',
+        }
+        self.assertTrue(method.check_params_dict(params))
+        self.assertRaises(ParamNotFound, method.check_params_dict, {**params, 'not_exist': 1})
+        del params['date']
+        self.assertRaises(RequireParamNotSet, method.check_params_dict, params)
+
+    def test_check_params_amqp_owned(self):
+        method = find_method('test_method', test_schema_rpc['CallbackService'])
+        data = {
+            'id': '1', 'method': 'test_method', 'service_callback': 'SendService', 'method_callback': '',
+            'test_str': '123', 'bin': '123123', 'float': 3333.33, 'int': 3333, 'bool': True,
+            'base64': 'base64=312fdvfbg2tgt', 'date': '2002-12-12T05:55:33±05:00',
+        }
+        copied = check_params_amqp(test_schema_rpc['CallbackService'], data, method)
+        self.assertIn('id', data)
+        message = check_params_amqp(test_schema_rpc['CallbackService'], data, method, owned=True)
+        # Параметрами сообщения становится сам словарь без служебных полей
+        self.assertIs(data, message.params)
+        self.assertEqual(copied.params, message.params)
+        self.assertEqual(('1', 'test_method', 'SendService'), (message.id, message.method, message.service_callback))
+
+    def test_check_params_batch(self):
+        method = find_method('test_method', test_schema_rpc['CallbackService'])
+        row = {
+            'test_str': '123',
+            'bin': '123123',
+            'float': 3333.33,
+            'int': 3333,
+            'bool': True,
+            'base64': 'base64=312fdvfbg2tgt',
+            'date': '2002-12-12T05:55:33±05:00',
+        }
+        rows = [row, {**row, 'int': '3333'}, {**row, 'not_exist': 1}, {k: v for k, v in row.items() if k != 'date'}]
+        errors = method.check_params_batch(rows)
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], WrongTypeParam)
+        self.assertIsInstance(errors[2], ParamNotFound)
+        self.assertIsInstance(errors[3], RequireParamNotSet)
+
+        columns = {name: [value, value] for name, value in row.items()}
+        columns['test_str'][1] = 'x' * 33
+        errors = method.check_params_batch(columns)
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], WrongSizeParam)
@@ -0,0 +1,115 @@
+import copy
+import unittest
+
+from api_lib.tests.test_data import test_schema_rpc
+from api_lib.utils.custom_exceptions import MethodNotFound, RequireParamNotSet
+from api_lib.utils.schema_index import SchemaIndex
+from api_lib.utils.validation_utils import InputParam, check_rls
+
+
+class TestSchemaIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.index = SchemaIndex(test_schema_rpc)
+
+    def test_get_method(self):
+        method = self.index.get_method('CallbackService', 'test_method')
+        self.assertEqual('test_method', method.name)
+        self.assertEqual('AMQP', method.type_conn)
+        self.assertEqual('write', method.type_method)
+        # Метод создается один раз
+        self.assertIs(method, self.index.get_method('CallbackService', 'test_method'))
+
+    def test_method_not_found(self):
+        with self.assertRaises(MethodNotFound):
+            self.index.get_method('CallbackService', 'not_exist')
+        with self.assertRaises(MethodNotFound):
+            self.index.get_method('NotExistService', 'test_method')
+
+    def test_get_route(self):
+        route = self.index.get_route('CallbackService')
+        self.assertEqual('callbackExchange', route.exchange)
+        self.assertEqual('callbackQueue', route.queue)
+        self.assertEqual('#callbackqueue#', route.routing_key)
+        with self.assertRaises(Exception):
+            self.index.get_route('NotExistService')
+
+    def test_reuse_method(self):
+        """ Повторная проверка параметров не зависит от предыдущих вызовов """
+        method = self.index.get_method('CallbackService', 'test_method')
+        with self.assertRaises(RequireParamNotSet):
+            method.check_params([InputParam(name='test_str', value='123')])
+        method.check_params([
+            InputParam(name='test_str', value='123'),
+            InputParam(name='bin', value=b'123123'),
+            InputParam(name='float', value=3333.33),
+            InputParam(name='int', value=3333),
+            InputParam(name='bool', value=True),
+            InputParam(name='base64', value='base64=312fdvfbg2tgt'),
+            InputParam(name='date', value='2002-12-12T05:55:33±05:00'),
+        ])
+        with self.assertRaises(RequireParamNotSet):
+            method.check_params([InputParam(name='test_str', value='123')])
+
+
+class TestRlsMatrix(unittest.TestCase):
+    schema = {
+        'FROM': {'RLS': {'ALL': None,
+                         'ALLOWED': {'allowed': ['method1']},
+                         'DISALLOWED': {'disallowed': ['method1']}}},
+        'FREE': {},
+        'ALL': {}, 'ALLOWED': {}, 'DISALLOWED': {}, 'CLOSED': {},
+    }
+
+    def setUp(self) -> None:
+        self.rls = SchemaIndex(self.schema).rls
+
+    def test_matches_check_rls(self):
+        for service_from in ('FROM', 'FREE'):
+            for service_to in ('ALL', 'ALLOWED', 'DISALLOWED', 'CLOSED'):
+                for method_name in ('method1', 'method2'):
+                    try:
+                        check_rls(self.schema[service_from], service_to, service_from, method_name)
+                        expected = None
+                    except Exception as e:
+                        expected = type(e)
+                    self.assertEqual(expected is None, self.rls.is_allowed(service_from, service_to, method_name))
+                    if expected is None:
+                        self.rls.check(service_from, service_to, method_name)
+                    else:
+                        self.assertRaises(expected, self.rls.check, service_from, service_to, method_name)
+
+    def test_denial_error(self):
+        error = self.rls.denial_error('FROM', 'method2')
+        self.assertEqual({'error': 'Метод method2 не доступен из сервиса FROM'}, error)
+        self.assertIs(error, self.rls.denial_error('FROM', 'method2'))
+
+
+class TestSchemaIndexUpdate(unittest.TestCase):
+
+    def test_incremental(self):
+        index = SchemaIndex(test_schema_rpc)
+        self.assertEqual({'CallbackService', 'SendService'}, index.changed_services)
+
+        schema = copy.deepcopy(test_schema_rpc)
+        schema['SendService']['RLS'] = {'CallbackService': {'allowed': ['test_method']}}
+        schema['NewService'] = copy.deepcopy(schema['CallbackService'])
+        updated = SchemaIndex(schema, previous=index)
+
+        self.assertEqual({'SendService', 'NewService'}, updated.changed_services)
+        # Неизменившиеся сервисы не перекомпилируются
+        self.assertIs(index.get_method('CallbackService', 'test_method'),
+                      updated.get_method('CallbackService', 'test_method'))
+        self.assertTrue(updated.rls.is_allowed('SendService', 'CallbackService', 'test_method'))
+        self.assertFalse(updated.rls.is_allowed('SendService', 'NewService', 'test_method'))
+
+        del schema['NewService']
+        self.assertEqual({'NewService'}, SchemaIndex(schema, previous=updated).changed_services)
+        self.assertEqual(set(), SchemaIndex(schema, previous=SchemaIndex(schema)).changed_services)
+
+    def test_in_place_change(self):
+        """ Изменение словаря схемы на месте определяется как изменение сервиса """
+        schema = copy.deepcopy(test_schema_rpc)
+        index = SchemaIndex(schema)
+        schema['SendService']['RLS'] = {'CallbackService': {'allowed': ['test_method']}}
+        self.assertEqual({'SendService'}, SchemaIndex(schema, previous=index).changed_services)
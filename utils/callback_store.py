@@ -0,0 +1,149 @@
+""" Хранилища состояний колбеков (исходящих сообщений, ожидающих ответа) """
+import abc
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple, Union
+
+import aioredis
+
+# Атомарное получение и удаление ключа (GETDEL доступен только с redis 6.2)
+GET_AND_DELETE_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if value then
+    redis.call('DEL', KEYS[1])
+end
+return value
+"""
+
+
+class CallbackStore(abc.ABC):
+    """ Интерфейс хранилища состояний колбеков """
+
+    @abc.abstractmethod
+    async def put(self, key: str, value: Union[str, bytes], ttl: Optional[int] = None):
+        """ Запись состояния, ttl - время хранения в секундах """
+
+    async def put_many(self, items: Iterable[Tuple[str, Union[str, bytes]]], ttl: Optional[int] = None):
+        """ Запись пачки состояний """
+        for key, value in items:
+            await self.put(key, value, ttl)
+
+    @abc.abstractmethod
+    async def pop(self, key: str) -> Optional[bytes]:
+        """ Атомарное получение и удаление состояния """
+
+    @abc.abstractmethod
+    async def expire(self, key: str, ttl: int) -> bool:
+        """ Изменение времени хранения состояния """
+
+    async def ping(self) -> bool:
+        return True
+
+    async def close(self):
+        pass
+
+
+class RedisCallbackStore(CallbackStore):
+    """ Хранилище состояний в редисе """
+
+    def __init__(self, redis_url: str = None, redis: aioredis.Redis = None):
+        self.redis = redis if redis is not None else aioredis.from_url(redis_url)
+        self._get_and_delete_script = self.redis.register_script(GET_AND_DELETE_SCRIPT)
+
+    async def put(self, key: str, value: Union[str, bytes], ttl: Optional[int] = None):
+        await self.redis.set(key, value, ex=ttl)
+
+    async def put_many(self, items: Iterable[Tuple[str, Union[str, bytes]]], ttl: Optional[int] = None):
+        """ Запись пачки состояний одним конвейером """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in items:
+                pipe.set(key, value, ex=ttl)
+            await pipe.execute()
+
+    async def pop(self, key: str) -> Optional[bytes]:
+        return await self._get_and_delete_script(keys=[key])
+
+    async def expire(self, key: str, ttl: int) -> bool:
+        return bool(await self.redis.expire(key, ttl))
+
+    async def ping(self) -> bool:
+        return await self.redis.ping()
+
+    async def close(self):
+        await self.redis.close()
+
+
+class MemoryCallbackStore(CallbackStore):
+    """
+    Хранилище состояний в памяти процесса (для одного экземпляра сервиса и тестов).
+    Размер ограничен количеством записей и/или суммарным размером значений,
+    при превышении удаляются самые старые записи.
+    """
+
+    def __init__(self, max_entries: Optional[int] = 10000, max_bytes: Optional[int] = None):
+        """
+        :param max_entries: Максимальное количество записей
+        :param max_bytes: Максимальный суммарный размер значений в байтах
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # {ключ: (значение, время истечения)}
+        self._items: 'OrderedDict[str, Tuple[bytes, Optional[float]]]' = OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def size(self) -> int:
+        """ Суммарный размер значений в байтах """
+        return self._size
+
+    def _remove(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._size -= len(item[0])
+        return item
+
+    def _remove_expired(self, now: float):
+        # Записи хранятся в порядке записи, поэтому при одинаковом ttl истекшие находятся в начале
+        while self._items:
+            key, (value, expires_at) = next(iter(self._items.items()))
+            if expires_at is None or expires_at > now:
+                break
+            self._remove(key)
+
+    def _evict(self):
+        while self._items and ((self.max_entries is not None and len(self._items) > self.max_entries)
+                               or (self.max_bytes is not None and self._size > self.max_bytes)):
+            self._remove(next(iter(self._items)))
+
+    async def put(self, key: str, value: Union[str, bytes], ttl: Optional[int] = None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        now = time.monotonic()
+        self._remove(key)
+        self._items[key] = (value, now + ttl if ttl else None)
+        self._size += len(value)
+        self._remove_expired(now)
+        self._evict()
+
+    async def pop(self, key: str) -> Optional[bytes]:
+        item = self._remove(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            return None
+        return value
+
+    async def expire(self, key: str, ttl: int) -> bool:
+        item = self._items.get(key)
+        if item is None:
+            return False
+        now = time.monotonic()
+        if item[1] is not None and item[1] <= now:
+            self._remove(key)
+            return False
+        self._items[key] = (item[0], now + ttl)
+        return True
@@ -0,0 +1,148 @@
+""" Сжатие тела AMQP сообщений, алгоритм передается в свойстве content_encoding """
+import abc
+import zlib
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from .custom_exceptions import DecompressedSizeExceeded, UnknownContentEncoding
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Сообщения меньше порога не сжимаются
+DEFAULT_THRESHOLD = 64 * 1024
+# Максимальный размер распакованного входящего сообщения
+DEFAULT_MAX_SIZE = 128 * 1024 * 1024
+
+
+class Codec(abc.ABC):
+    """ Алгоритм сжатия """
+    content_encoding: str
+
+    @abc.abstractmethod
+    def compress(self, body: bytes, level: Optional[int] = None) -> bytes:
+        """ Сжатие, level - уровень сжатия, по умолчанию стандартный для алгоритма """
+
+    @abc.abstractmethod
+    def decompress(self, body: bytes, max_size: int) -> bytes:
+        """ Распаковка не более max_size + 1 байт (больший результат означает превышение размера) """
+
+
+class ZlibCodec(Codec):
+    content_encoding = 'deflate'
+
+    def compress(self, body: bytes, level: Optional[int] = None) -> bytes:
+        return zlib.compress(body, -1 if level is None else level)
+
+    def decompress(self, body: bytes, max_size: int) -> bytes:
+        decompressor = zlib.decompressobj()
+        result = decompressor.decompress(body, max_size + 1)
+        if len(result) <= max_size and not decompressor.eof:
+            raise zlib.error('Сжатые данные обрезаны')
+        return result
+
+
+class ZstdCodec(Codec):
+    content_encoding = 'zstd'
+
+    def compress(self, body: bytes, level: Optional[int] = None) -> bytes:
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(body)
+
+    def decompress(self, body: bytes, max_size: int) -> bytes:
+        # Размер в заголовке кадра может отсутствовать или быть неверным, поэтому распаковка потоком
+        with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+            return reader.read(max_size + 1)
+
+
+class Lz4Codec(Codec):
+    content_encoding = 'lz4'
+
+    def compress(self, body: bytes, level: Optional[int] = None) -> bytes:
+        return lz4.frame.compress(body, compression_level=0 if level is None else level)
+
+    def decompress(self, body: bytes, max_size: int) -> bytes:
+        return lz4.frame.LZ4FrameDecompressor().decompress(body, max_length=max_size + 1)
+
+
+# Доступные алгоритмы {content_encoding: алгоритм}
+CODECS: Dict[str, Codec] = {ZlibCodec.content_encoding: ZlibCodec()}
+if zstandard is not None:
+    CODECS[ZstdCodec.content_encoding] = ZstdCodec()
+if lz4 is not None:
+    CODECS[Lz4Codec.content_encoding] = Lz4Codec()
+# content_encoding, которые формирует библиотека: остальные значения (например кодировка utf-8,
+# заданная другими отправителями) не означают сжатие
+CONTENT_ENCODINGS = frozenset((ZlibCodec.content_encoding, ZstdCodec.content_encoding, Lz4Codec.content_encoding))
+# Названия алгоритмов для настройки
+ALIASES = {'zlib': 'deflate', 'zstandard': 'zstd'}
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS[ALIASES.get(name, name)]
+    except KeyError:
+        raise UnknownContentEncoding(name)
+
+
+class Compression(object):
+    """ Настройка сжатия исходящих сообщений """
+
+    def __init__(self, algorithm: str = 'zlib', threshold: int = DEFAULT_THRESHOLD, level: int = None):
+        """
+        :param algorithm: zlib, zstd (нужен пакет zstandard) или lz4 (нужен пакет lz4)
+        :param threshold: Минимальный размер сообщения в байтах для сжатия
+        :param level: Уровень сжатия, по умолчанию стандартный для алгоритма
+        """
+        self.codec = get_codec(algorithm)
+        self.threshold = threshold
+        self.level = level
+
+    def compress(self, body: bytes) -> Tuple[bytes, Optional[str]]:
+        """
+        Сжатие сообщения, если оно больше порога и сжатие уменьшает размер.
+        :return: (тело, content_encoding или None, если сообщение не сжато)
+        """
+        if len(body) < self.threshold:
+            return body, None
+        compressed = self.codec.compress(body, self.level)
+        if len(compressed) >= len(body):
+            return body, None
+        return compressed, self.codec.content_encoding
+
+
+def compress(body: bytes, compression: Optional[Compression]) -> Tuple[bytes, Optional[str]]:
+    """ Сжатие сообщения, если сжатие настроено """
+    if compression is None:
+        return body, None
+    return compression.compress(body)
+
+
+def decompress(body: bytes, content_encoding: Optional[str], max_size: int = DEFAULT_MAX_SIZE) -> bytes:
+    r"""
+    Распаковка тела входящего сообщения по content_encoding.
+    Распаковываются только алгоритмы библиотеки, с остальными content_encoding тело возвращается без изменений.
+    :param max_size: Максимальный размер распакованного сообщения в байтах
+
+    Raises:
+        UnknownContentEncoding - алгоритм библиотеки не установлен
+        DecompressedSizeExceeded - распакованное сообщение больше max_size
+    """
+    if content_encoding not in CONTENT_ENCODINGS:
+        if content_encoding and content_encoding != 'identity':
+            logger.debug(f'[Compression] content_encoding={content_encoding!r} не является сжатием')
+        return body
+    codec = CODECS.get(content_encoding)
+    if codec is None:
+        raise UnknownContentEncoding(content_encoding)
+    result = codec.decompress(body, max_size)
+    if len(result) > max_size:
+        raise DecompressedSizeExceeded(max_size)
+    return result
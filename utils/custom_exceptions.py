@@ -77,3 +77,37 @@ class WrongSizeParam(Exception):
         return f'Параметр {self.param_name} не соответствует размеру {self.size}'
 
 
+class SchemaCacheNotFound(Exception):
+    def __init__(self, path: str):
+        self.path = path
+
+    def __str__(self):
+        return f'Нет кеша схемы апи {self.path} для запуска без сервера апи'
+
+
+class SchemaLoadFailed(Exception):
+    def __init__(self, status: int):
+        self.status = status
+
+    def __str__(self):
+        return f'Сервер апи вернул код {self.status} при получении схемы'
+
+
+class UnknownContentEncoding(Exception):
+    def __init__(self, content_encoding: str):
+        self.content_encoding = content_encoding
+
+    def __str__(self):
+        return f'Неизвестное или неподдерживаемое сжатие сообщения {self.content_encoding}'
+
+
+class DecompressedSizeExceeded(ValueError):
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+
+    def __str__(self):
+        return f'Распакованное сообщение больше {self.max_size} байт'
+
+
+class FrameError(ValueError):
+    """ Сообщение в бинарном формате повреждено """
@@ -0,0 +1,99 @@
+"""
+Бинарный формат сообщения: json заголовок и двоичные секции параметров без base64.
+
+    MAGIC (4 байта) | длина заголовка (4 байта, big-endian) | заголовок (json) | секции подряд
+
+Заголовок: {"sections": [[имя параметра, длина], ...], "message": {сообщение без двоичных параметров}}.
+Сообщения в json начинаются с '{', поэтому формат определяется по первым байтам тела
+и старые сообщения обрабатываются как раньше.
+"""
+import base64
+import struct
+from typing import Any, Dict, List, Tuple, Union
+
+from . import utils_message
+from .custom_exceptions import FrameError
+
+MAGIC = b'\x00APF'
+_HEADER_LENGTH = struct.Struct('>I')
+_PREFIX_SIZE = len(MAGIC) + _HEADER_LENGTH.size
+
+# Типы параметров, значения которых передаются двоичными секциями
+BINARY_TYPES = ('bin', 'base64')
+BINARY_VALUE_TYPES = (bytes, bytearray, memoryview)
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def is_binary_value(value: Any) -> bool:
+    return isinstance(value, BINARY_VALUE_TYPES)
+
+
+def split_binary(message: dict) -> Tuple[dict, Dict[str, BytesLike]]:
+    """ Разделение сообщения на json часть и двоичные значения """
+    binary = {name: value for name, value in message.items() if is_binary_value(value)}
+    if not binary:
+        return message, binary
+    return {name: value for name, value in message.items() if name not in binary}, binary
+
+
+def binary_to_base64(message: dict) -> dict:
+    """ Замена двоичных значений на строки base64 (json представление сообщения) """
+    message, binary = split_binary(message)
+    if not binary:
+        return message
+    return {**message, **{name: to_base64(value) for name, value in binary.items()}}
+
+
+def to_base64(value: BytesLike) -> str:
+    """ Двоичное значение в формате параметра base64 """
+    return 'base64=' + base64.b64encode(value).decode('ascii')
+
+
+def encode_frame(message_json: str, sections: Dict[str, BytesLike]) -> bytes:
+    """
+    Сборка сообщения в бинарном формате.
+    :param message_json: Серилизованная json часть сообщения
+    :param sections: Двоичные значения {имя параметра: значение}
+    """
+    descriptors = [[name, memoryview(value).nbytes] for name, value in sections.items()]
+    header = f'{{"sections": {utils_message.serialize_message(descriptors)}, "message": {message_json}}}'
+    header = header.encode('utf-8')
+    return b''.join([MAGIC, _HEADER_LENGTH.pack(len(header)), header, *sections.values()])
+
+
+def is_frame(body: BytesLike) -> bool:
+    return body[:len(MAGIC)] == MAGIC
+
+
+def decode_frame(body: BytesLike) -> dict:
+    r"""
+    Разбор сообщения в бинарном формате.
+    Двоичные параметры возвращаются как memoryview на тело сообщения, без копирования.
+
+    Raises:
+        FrameError - сообщение повреждено
+    """
+    view = memoryview(body)
+    if len(view) < _PREFIX_SIZE or not is_frame(view):
+        raise FrameError('Сообщение не в бинарном формате')
+    header_length, = _HEADER_LENGTH.unpack_from(view, len(MAGIC))
+    offset = _PREFIX_SIZE + header_length
+    if offset > len(view):
+        raise FrameError('Заголовок сообщения обрезан')
+    header = utils_message.loads(view[_PREFIX_SIZE:offset].tobytes())
+    message: dict = header['message']
+    sections: List[Tuple[str, int]] = header['sections']
+    for name, length in sections:
+        if offset + length > len(view):
+            raise FrameError(f'Секция {name} обрезана')
+        message[name] = view[offset:offset + length]
+        offset += length
+    return message
+
+
+def loads_message(body: BytesLike) -> dict:
+    """ Разбор входящего сообщения в любом формате: json или бинарном """
+    if is_frame(body):
+        return decode_frame(body)
+    return utils_message.loads(body)
@@ -1,13 +1,19 @@
 import copy
 import datetime
 import json
-from typing import Union
+from typing import Optional, Union
 
-from api_lib.utils import convert_utils
-from api_lib.utils.utils_message import create_hash, serialize_message
+from api_lib.utils import convert_utils, framing, utils_message
+from api_lib.utils.utils_message import serialize_message, serialize_with_id, loads
+
+
+# Служебные поля входящего сообщения, остальные поля - параметры метода
+ENVELOPE_FIELDS = ('id', 'method_callback', 'service_callback', 'method')
 
 
 class IncomingMessage:
+    __slots__ = ('params', 'service_callback', 'id', 'method', 'method_callback', 'additional_data', '_body')
+
     def __init__(self, response_id: str, service_callback: str, params: dict, method_callback: str,
                  additional_data: dict = None, method=None):
         """
@@ -25,30 +31,55 @@ class IncomingMessage:
         self.method = method
         self.method_callback = method_callback
         self.additional_data = additional_data
+        # Тело нового исходящего сообщения, серилизованное при вычислении id (см. create),
+        # используется при первой отправке
+        self._body: Optional[bytes] = None
 
     @staticmethod
-    def from_dict(message: dict):
-        params = copy.copy(message)
-        del params['id']
-        del params['method_callback']
-        del params['service_callback']
-        del params['method']
-        if 'additional_data' not in params:
-            return IncomingMessage(
-                response_id=message['id'],
-                service_callback=message['service_callback'],
-                params=params,
-                method_callback=message['method_callback'],
-                method=message['method'],
-            )
+    def create(service_callback: str, method: str, method_callback: str, params: dict,
+               binary_transport: bool = False, id_strategy: utils_message.IdStrategy = None):
+        """
+        Новое исходящее сообщение: серилизуется один раз, id вычисляется по серилизованному сообщению
+        :param binary_transport: Двоичные параметры передаются секциями бинарного формата, иначе строками base64
+        :param id_strategy: Способ получения id, по умолчанию utils_message.id_strategy
+        """
+        message = IncomingMessage(response_id=None, service_callback=service_callback, params=params,
+                                  method_callback=method_callback, method=method)
+        if binary_transport:
+            message_dict, sections = framing.split_binary(message._to_dict())
         else:
-            return IncomingMessage(
-                response_id=message['id'],
-                service_callback=message['service_callback'],
-                params=params,
-                method_callback=message['method_callback'],
-                additional_data=params['additional_data']
-            )
+            message_dict, sections = framing.binary_to_base64(message._to_dict()), None
+        if not sections:
+            message_json, message.id = serialize_with_id(message_dict, id_strategy)
+            message._body = message_json.encode('utf-8')
+            return message
+
+        # id вычисляется по json части и двоичным секциям
+        message_json = serialize_message(message_dict)
+        message.id = (id_strategy or utils_message.id_strategy).make_id_parts([message_json.encode('utf-8'), *sections.values()])
+        message._body = framing.encode_frame(
+            utils_message.codec.append_fields(message_json, {'id': message.id}), sections)
+        return message
+
+    @staticmethod
+    def from_dict(message: dict):
+        return IncomingMessage.from_owned_dict(copy.copy(message))
+
+    @staticmethod
+    def from_owned_dict(message: dict):
+        """
+        Сообщение из словаря без копирования: служебные поля извлекаются из словаря,
+        оставшийся словарь становится параметрами. Словарь не должен использоваться после вызова.
+        """
+        response_id, method_callback, service_callback, method = [message.pop(name) for name in ENVELOPE_FIELDS]
+        return IncomingMessage(
+            response_id=response_id,
+            service_callback=service_callback,
+            params=message,
+            method_callback=method_callback,
+            method=method,
+            additional_data=message.get('additional_data'),
+        )
 
     def json(self, additional_data: dict = None):
         """
@@ -56,18 +87,30 @@ class IncomingMessage:
         :param additional_data: Дополнительные для записи в редис
         :return:
         """
-        correct_json = {
+        message = {**framing.binary_to_base64(self._to_dict()), 'id': self.id}
+        # TODO: id протестировать работу + не учитывать допольнительные данные при хешировании
+        if additional_data:
+            # Заменяет additional_data из параметров (состояние колбека, восстановленное из редиса)
+            message['additional_data'] = additional_data
+        return serialize_message(message)
+
+    def to_bytes(self) -> bytes:
+        """ Тело AMQP сообщения: json или бинарный формат, если есть двоичные параметры """
+        body, self._body = self._body, None
+        if body is not None:
+            return body
+        message_dict, sections = framing.split_binary(self._to_dict())
+        if not sections:
+            return self.json().encode('utf-8')
+        return framing.encode_frame(serialize_message({**message_dict, 'id': self.id}), sections)
+
+    def _to_dict(self) -> dict:
+        return {
             "method": self.method,
             "service_callback": self.service_callback,
             'method_callback': self.method_callback,
+            **self.params,
         }
-        # TODO: id протестировать работу + не учитывать допольнительные данные при хешировании
-        if additional_data:
-            correct_json = {**correct_json, **self.params, 'id': self.id, 'additional_data': additional_data}
-        else:
-            correct_json = {**correct_json, **self.params, 'id': self.id}
-
-        return serialize_message(correct_json)
 
     def callback_message(self, param: Union[dict, list, str], result: bool):
         """
@@ -86,6 +129,7 @@ class IncomingMessage:
         """ Отправка сообщения обратно в ту же очередь для повторной обработки """
         # TODO: проверка на recheck_date
         self.params['recheck_date'] = convert_utils.convert_date_into_iso(recheck_date)
+        self._body = None
         return self
 
 
@@ -114,13 +158,13 @@ def create_callback_message_amqp(message: dict,
         }
     }
 
-    hash_id = create_hash(correct_json)
-    correct_json['id'] = hash_id
-
-    return serialize_message(correct_json)
+    body, _ = serialize_with_id(correct_json)
+    return body
 
 
 class CallbackMessage:
+    __slots__ = ('incoming_message', 'id', 'method', 'service_callback', 'response_id', 'result', 'response')
+
     def __init__(self,
                  method: str,
                  service_callback: str,
@@ -147,7 +191,7 @@ class CallbackMessage:
         self.result = result
         if isinstance(response, str):
             try:
-                self.response = json.loads(response)
+                self.response = loads(response)
             except json.JSONDecodeError:
                 self.response = response
         else:
@@ -166,10 +210,8 @@ class CallbackMessage:
             }
         }
 
-        hash_id = create_hash(correct_json)
-        correct_json['id'] = hash_id
-
-        return serialize_message(correct_json)
+        body, _ = serialize_with_id(correct_json)
+        return body
 
     @staticmethod
     def from_dict(message: dict):
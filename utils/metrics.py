@@ -0,0 +1,286 @@
+""" Метрики обработки сообщений и запросов с выдачей в текстовом формате Prometheus """
+import abc
+import bisect
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм: длительность в секундах и размер в байтах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(256 * 4 ** power for power in range(10))
+
+# Метка метода, отсутствующего в схеме (имена методов приходят из сообщений)
+UNKNOWN_METHOD = 'unknown'
+# Ограничение количества ожидаемых колбеков для времени ответа
+MAX_PENDING_CALLBACKS = 10000
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """ Метрика с набором меток, значения хранятся по кортежу значений меток """
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """ Строки метрики: (имя, имена меток, значения меток, значение) """
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, label_names, label_values, value in self.samples():
+            lines.append(f'{name}{_format_labels(label_names, label_values)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *label_values: str, value: float = 1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + value
+
+    def get(self, *label_values: str) -> float:
+        return self.values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self.values.items())
+        for label_values, value in items:
+            yield self.name, self.label_names, label_values, value
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, *label_values: str, value: float = 1):
+        self.inc(*label_values, value=-value)
+
+    def set(self, *label_values: str, value: float):
+        with self._lock:
+            self.values[label_values] = value
+
+
+class Histogram(Metric):
+    """ Гистограмма с фиксированными корзинами, квантили оцениваются по корзинам """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # {значения меток: [количество по корзинам (последняя - +Inf), сумма, количество]}
+        self.values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *label_values: str) -> int:
+        state = self.values.get(label_values)
+        return state[2] if state is not None else 0
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """ Оценка квантиля линейной интерполяцией внутри корзины (как histogram_quantile) """
+        state = self.values.get(label_values)
+        if state is None or not state[2]:
+            return None
+        counts, _, total = state
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def samples(self):
+        label_names = self.label_names + ('le',)
+        # Снимок значений: наблюдения продолжают записываться из других потоков
+        with self._lock:
+            items = sorted((labels, (list(counts), total_sum, total_count))
+                           for labels, (counts, total_sum, total_count) in self.values.items())
+        for label_values, (counts, total_sum, total_count) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', label_names, label_values + (_format_value(bound),), cumulative
+            yield f'{self.name}_sum', self.label_names, label_values, total_sum
+            yield f'{self.name}_count', self.label_names, label_values, total_count
+
+
+class Metrics(object):
+    """ Набор метрик с выдачей по HTTP в текстовом формате Prometheus """
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def start_http_server(self, port: int, address: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """
+        Запуск HTTP сервера метрик в фоновом потоке (GET /metrics).
+        :param port: Порт, 0 - любой свободный (см. server.server_port)
+        :param address: Адрес, по умолчанию только локальные подключения
+        """
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((address, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    def stop_http_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class ApiMetrics(Metrics):
+    """ Метрики библиотеки: входящие сообщения, исходящие запросы и время ответа на них """
+
+    def __init__(self):
+        super().__init__()
+        self.messages = self.add(Counter(
+            'api_messages_total', 'Обработанные входящие сообщения', ('method',)))
+        self.message_errors = self.add(Counter(
+            'api_message_errors_total', 'Входящие сообщения, обработанные с ошибкой', ('method',)))
+        self.message_duration = self.add(Histogram(
+            'api_message_duration_seconds', 'Время обработки входящего сообщения', ('method',)))
+        self.messages_in_flight = self.add(Gauge(
+            'api_messages_in_flight', 'Сообщения в обработке', ('method',)))
+        self.message_size = self.add(Histogram(
+            'api_message_size_bytes', 'Размер тела сообщения', ('direction', 'method'), SIZE_BUCKETS))
+        self.requests = self.add(Counter(
+            'api_requests_total', 'Отправленные запросы', ('service', 'method', 'transport')))
+        self.request_errors = self.add(Counter(
+            'api_request_errors_total', 'Запросы, завершившиеся ошибкой', ('service', 'method', 'transport')))
+        self.request_duration = self.add(Histogram(
+            'api_request_duration_seconds', 'Время отправки запроса (для HTTP - до получения ответа)',
+            ('service', 'method', 'transport')))
+        self.callback_roundtrip = self.add(Histogram(
+            'api_callback_roundtrip_seconds', 'Время от отправки запроса до получения колбека',
+            ('service', 'method')))
+        # Ожидаемые колбеки {id сообщения: (время отправки, сервис, метод)}
+        self._pending_callbacks: 'OrderedDict[str, Tuple[float, str, str]]' = OrderedDict()
+        self._pending_lock = threading.Lock()
+
+    @staticmethod
+    def method_label(method_name: Optional[str], methods: Optional[dict]) -> str:
+        """ Метка метода входящего сообщения: методы без обработчика объединяются в unknown """
+        if methods and method_name in methods:
+            return method_name
+        return UNKNOWN_METHOD
+
+    def message_started(self, method: str) -> float:
+        """ Начало обработки входящего сообщения, возвращает время начала для message_finished """
+        self.messages_in_flight.inc(method)
+        return time.perf_counter()
+
+    def message_finished(self, method: str, started: float, error: bool = False):
+        self.message_duration.observe(time.perf_counter() - started, method)
+        self.messages_in_flight.dec(method)
+        self.messages.inc(method)
+        if error:
+            self.message_errors.inc(method)
+
+    @contextmanager
+    def track_request(self, service_name: str, method_name: str, transport: str, count: int = 1):
+        """
+        Учет отправки запроса, исключение внутри блока считается ошибкой.
+        Возвращает время начала отправки. Для пачки запросов (count) время записывается один раз.
+        """
+        labels = (service_name, method_name, transport)
+        started = time.perf_counter()
+        try:
+            yield started
+        except BaseException:
+            self.request_errors.inc(*labels, value=count)
+            raise
+        finally:
+            self.request_duration.observe(time.perf_counter() - started, *labels)
+            self.requests.inc(*labels, value=count)
+
+    def callback_expected(self, message_id: str, service_name: str, method_name: str, sent_at: float = None):
+        """ Запрос отправлен, ожидается колбек """
+        if sent_at is None:
+            sent_at = time.perf_counter()
+        with self._pending_lock:
+            self._pending_callbacks[message_id] = (sent_at, service_name, method_name)
+            if len(self._pending_callbacks) > MAX_PENDING_CALLBACKS:
+                self._pending_callbacks.popitem(last=False)
+
+    def callback_received(self, response_id: str):
+        """ Получен колбек на запрос, записывается время ответа """
+        with self._pending_lock:
+            pending = self._pending_callbacks.pop(response_id, None)
+        if pending is not None:
+            sent_at, service_name, method_name = pending
+            self.callback_roundtrip.observe(time.perf_counter() - sent_at, service_name, method_name)
+
+
+# Метрики процесса, используются экземплярами ApiSync/ApiAsync по умолчанию
+api_metrics = ApiMetrics()
@@ -0,0 +1,243 @@
+"""
+Цепочка middleware вокруг вызова обработчиков и отправки запросов.
+
+Middleware получает контекст вызова в before, затем after с результатом или on_error с исключением.
+before вызываются в порядке списка, after и on_error - в обратном (как вложенные обертки).
+Исключение обработчика после on_error пробрасывается дальше без изменений.
+Если before middleware завершился исключением, on_error вызывается у предыдущих middleware.
+"""
+import cProfile
+import inspect
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, List, Optional, Sequence
+
+from loguru import logger as default_logger
+
+# tracemalloc.reset_peak появился в Python 3.9
+_HAS_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+# Виды вызовов
+MESSAGE = 'message'
+CALLBACK = 'callback'
+SEND = 'send'
+
+
+class CallContext(object):
+    """ Контекст одного вызова, общий для всех middleware цепочки """
+    __slots__ = ('kind', 'method', 'service', 'args', 'state')
+
+    def __init__(self, kind: str, method: str, service: Optional[str], args: tuple):
+        """
+        :param kind: Вид вызова: message (обработчик метода), callback (обработчик колбека), send (отправка запроса)
+        :param method: Метод (для колбека - метод - обработчик колбека)
+        :param service: Сервис, отправивший сообщение, или сервис - адресат запроса
+        :param args: Аргументы вызова: для message и callback - сообщение,
+         для send - (метод MethodApi, параметры List[InputParam]) одного запроса
+        """
+        self.kind = kind
+        self.method = method
+        self.service = service
+        self.args = args
+        # Данные middleware между before и after {ключ: значение}
+        self.state = {}
+
+
+class Middleware(object):
+    """ Базовый middleware, методы могут быть корутинами, если используются только в ApiAsync """
+
+    def before(self, context: CallContext):
+        pass
+
+    def after(self, context: CallContext, result: Any):
+        pass
+
+    def on_error(self, context: CallContext, error: BaseException):
+        pass
+
+
+class MiddlewareChain(object):
+    """ Вызов функции через цепочку middleware, без middleware функция вызывается напрямую """
+
+    def __init__(self, middlewares: Sequence[Middleware] = None):
+        self.middlewares: List[Middleware] = list(middlewares or ())
+
+    def add(self, middleware: Middleware):
+        self.middlewares.append(middleware)
+
+    def call(self, kind: str, method: str, service: Optional[str], func: Callable, *args):
+        if not self.middlewares:
+            return func(*args)
+        context = CallContext(kind, method, service, args)
+        entered = 0
+        try:
+            for middleware in self.middlewares:
+                middleware.before(context)
+                entered += 1
+            result = func(*args)
+        except BaseException as e:
+            # on_error вызывается только у middleware, before которых выполнен
+            for middleware in reversed(self.middlewares[:entered]):
+                middleware.on_error(context, e)
+            raise
+        for middleware in reversed(self.middlewares):
+            middleware.after(context, result)
+        return result
+
+    async def acall(self, kind: str, method: str, service: Optional[str], func: Callable, *args):
+        """ Вызов корутины, методы middleware могут быть как функциями, так и корутинами """
+        if not self.middlewares:
+            return await func(*args)
+        context = CallContext(kind, method, service, args)
+        entered = 0
+        try:
+            for middleware in self.middlewares:
+                await _maybe_await(middleware.before(context))
+                entered += 1
+            result = await func(*args)
+        except BaseException as e:
+            for middleware in reversed(self.middlewares[:entered]):
+                await _maybe_await(middleware.on_error(context, e))
+            raise
+        for middleware in reversed(self.middlewares):
+            await _maybe_await(middleware.after(context, result))
+        return result
+
+
+async def _maybe_await(value):
+    if inspect.isawaitable(value):
+        await value
+
+
+class TimingMiddleware(Middleware):
+    """ Длительность вызова (context.state['duration']), вызовы дольше порога логируются """
+
+    def __init__(self, threshold: float = 1, logger=None):
+        """
+        :param threshold: Порог логирования в секундах, 0 - логировать все вызовы
+        """
+        self.threshold = threshold
+        self.logger = logger or default_logger
+
+    def before(self, context: CallContext):
+        context.state['started'] = time.perf_counter()
+
+    def after(self, context: CallContext, result: Any):
+        self._finish(context, 'выполнен')
+
+    def on_error(self, context: CallContext, error: BaseException):
+        self._finish(context, f'завершен ошибкой {error!r}')
+
+    def _finish(self, context: CallContext, status: str):
+        duration = context.state['duration'] = time.perf_counter() - context.state['started']
+        if duration >= self.threshold:
+            self.logger.warning(f"[Timing] {context.kind} {context.service}.{context.method} {status} "
+                                f"за {duration:.3f} с")
+
+
+class ProfileMiddleware(Middleware):
+    r"""
+    Профилирование cProfile выборки вызовов, профиль медленных вызовов логируется или сохраняется в файл.
+    Одновременно профилируется только один вызов, остальные пропускаются.
+    В ApiAsync профиль включает другие корутины, выполнявшиеся во время ожидания обработчика.
+    """
+
+    def __init__(self, threshold: float = 1, sample_rate: float = 1, output_dir: str = None,
+                 sort: str = 'cumulative', limit: int = 30, logger=None):
+        """
+        :param threshold: Сохраняются профили вызовов дольше порога (секунды)
+        :param sample_rate: Доля профилируемых вызовов (0..1)
+        :param output_dir: Каталог для файлов .prof, по умолчанию статистика пишется в лог
+        :param sort: Сортировка статистики в логе (см. pstats.Stats.sort_stats)
+        :param limit: Количество строк статистики в логе
+        """
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.sort = sort
+        self.limit = limit
+        self.logger = logger or default_logger
+        self._lock = threading.Lock()
+
+    def before(self, context: CallContext):
+        if random.random() >= self.sample_rate or not self._lock.acquire(blocking=False):
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Включен другой профилировщик
+            self._lock.release()
+            return
+        context.state['profiler'] = profiler
+        context.state['profile_started'] = time.perf_counter()
+
+    def after(self, context: CallContext, result: Any):
+        self._finish(context)
+
+    def on_error(self, context: CallContext, error: BaseException):
+        self._finish(context)
+
+    def _finish(self, context: CallContext):
+        profiler: cProfile.Profile = context.state.pop('profiler', None)
+        if profiler is None:
+            return
+        profiler.disable()
+        self._lock.release()
+        duration = time.perf_counter() - context.state['profile_started']
+        if duration < self.threshold:
+            return
+        if self.output_dir:
+            path = os.path.join(self.output_dir,
+                                f'{context.kind}_{context.method}_{time.time():.0f}_{uuid.uuid4().hex[:8]}.prof')
+            profiler.dump_stats(path)
+            self.logger.warning(f"[Profile] {context.kind} {context.service}.{context.method} "
+                                f"{duration:.3f} с, профиль {path}")
+            return
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats(self.sort).print_stats(self.limit)
+        self.logger.warning(f"[Profile] {context.kind} {context.service}.{context.method} "
+                            f"{duration:.3f} с\n{stream.getvalue()}")
+
+
+class TracemallocMiddleware(Middleware):
+    r"""
+    Пиковое выделение памяти за вызов (context.state['memory_peak']), вызовы выше порога логируются.
+    Запускает tracemalloc, если он не запущен (замедляет выделение памяти во всем процессе).
+    Пик общий для процесса, поэтому при параллельной обработке включает память других вызовов.
+    На Python 3.8 (нет tracemalloc.reset_peak) вместо пика записывается прирост памяти за вызов.
+    """
+
+    def __init__(self, threshold: int = 10 * 1024 * 1024, logger=None):
+        """
+        :param threshold: Порог логирования в байтах
+        """
+        self.threshold = threshold
+        self.logger = logger or default_logger
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def before(self, context: CallContext):
+        if _HAS_RESET_PEAK:
+            tracemalloc.reset_peak()
+        context.state['memory_started'] = tracemalloc.get_traced_memory()[0]
+
+    def after(self, context: CallContext, result: Any):
+        self._finish(context)
+
+    def on_error(self, context: CallContext, error: BaseException):
+        self._finish(context)
+
+    def _finish(self, context: CallContext):
+        current, peak = tracemalloc.get_traced_memory()
+        started = context.state['memory_started']
+        peak = context.state['memory_peak'] = (peak if _HAS_RESET_PEAK else current) - started
+        if peak >= self.threshold:
+            self.logger.warning(f"[Memory] {context.kind} {context.service}.{context.method} "
+                                f"пик {peak / 1024:,.0f} КБ, прирост {(current - started) / 1024:,.0f} КБ")
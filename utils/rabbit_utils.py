@@ -5,8 +5,8 @@ import json
 from typing import Union
 
 from .custom_exceptions import *
-from .messages import IncomingMessage
-from .validation_utils import find_method, InputParam
+from .messages import IncomingMessage, ENVELOPE_FIELDS
+from .validation_utils import find_method, InputParam, MethodApi
 
 
 def get_route_key(queue_name: str):
@@ -14,30 +14,22 @@ def get_route_key(queue_name: str):
     return f'#{queue_name.lower()}#'
 
 
-def check_params_amqp(schema_service: dict, params: dict):
-    """ Проверка входящих/исходящих параметров """
-    try:
-        assert 'id' in params.keys() \
-               and 'service_callback' in params.keys() \
-               and 'method' in params.keys() \
-               and 'method_callback' in params.keys()
-    except AssertionError:
+def check_params_amqp(schema_service: dict, params: dict, method: MethodApi = None, owned: bool = False):
+    """
+    Проверка входящих/исходящих параметров
+    :param method: Метод из скомпилированной схемы, если не указан ищется в schema_service
+    :param owned: Словарь params можно изменять: служебные поля извлекаются из него без копирования
+     и он становится параметрами сообщения
+    """
+    if not all(name in params for name in ENVELOPE_FIELDS):
         raise ValueError('Сообщение обязательно должно содержать id, response_id, method, method_callback')
-    method = find_method(params['method'], schema_service)
-    params_method = copy.copy(params)
-    del params_method['id']
-    del params_method['service_callback']
-    del params_method['method']
-    del params_method['method_callback']
-
-    method.check_params(InputParam.from_dict(params_method))
-
-    return IncomingMessage(response_id=params['id'],
-                           params=params_method,
-                           method=params['method'],
-                           method_callback=params['method_callback'],
-                           service_callback=params['service_callback'])
-    # params_method, params['id'], params['service_callback'], params['method'], params['method_callback']
+    if method is None:
+        method = find_method(params['method'], schema_service)
+    message = IncomingMessage.from_owned_dict(params if owned else copy.copy(params))
+
+    method.check_params_dict(message.params)
+
+    return message
 
 
 def service_amqp_url(service_schema: dict):
@@ -0,0 +1,66 @@
+""" Локальный кеш схемы апи для быстрого запуска """
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+
+from .utils_message import loads
+
+
+def hash_content(content: bytes) -> str:
+    """ Хеш ответа сервера апи со схемой """
+    return hashlib.sha256(content).hexdigest()
+
+
+class SchemaCache(object):
+    """
+    Файл с последней полученной схемой: первая строка - json с хешем и ETag ответа сервера,
+    далее ответ сервера без изменений
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hash: Optional[str] = None
+        self.etag: Optional[str] = None
+
+    def load(self) -> Optional[dict]:
+        """ Схема из кеша, None если кеша нет или он поврежден """
+        try:
+            with open(self.path, 'rb') as file:
+                header = json.loads(file.readline())
+                content = file.read()
+            if hash_content(content) != header['hash']:
+                return None
+            schema = loads(content)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        self.hash = header['hash']
+        self.etag = header.get('etag')
+        return schema
+
+    def is_changed(self, content: bytes) -> bool:
+        """ Отличается ли ответ сервера от схемы в кеше """
+        return hash_content(content) != self.hash
+
+    def save(self, content: bytes, etag: str = None):
+        """ Атомарная запись ответа сервера в кеш """
+        self.hash = hash_content(content)
+        self.etag = etag
+        header = json.dumps({'hash': self.hash, 'etag': etag}).encode('utf-8')
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.schema_cache')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(header + b'\n' + content)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def conditional_headers(self) -> dict:
+        """ Заголовки условного запроса схемы """
+        if self.etag:
+            return {'If-None-Match': self.etag}
+        return {}
@@ -0,0 +1,189 @@
+""" Схема апи, скомпилированная при загрузке для быстрого поиска методов """
+import copy
+from typing import Dict, Optional, Tuple, FrozenSet, Set, NamedTuple
+
+from .custom_exceptions import MethodNotFound, AllServiceMethodsNotAllowed, ServiceMethodNotAllowed
+from .rabbit_utils import get_route_key
+from .validation_utils import MethodApi
+
+
+def _iter_service_methods(service_schema: dict):
+    """ Обход методов сервиса в порядке поиска find_method """
+    for key, value in service_schema.items():
+        if not isinstance(value, dict) or 'methods' not in value:
+            continue
+
+        for type_method in ('write', 'read'):
+            if type_method not in value['methods']:
+                continue
+            for method_name, method_params in value['methods'][type_method].items():
+                yield MethodApi(params=method_params, type_conn=key, type_method=type_method,
+                                config=value['config'], method_name=method_name)
+
+
+def compile_service_methods(service_schema: dict) -> Dict[str, MethodApi]:
+    """ Методы сервиса {название метода: MethodApi} """
+    methods: Dict[str, MethodApi] = {}
+    for method in _iter_service_methods(service_schema):
+        # Как и в find_method, при совпадении имен используется первый найденный метод
+        methods.setdefault(method.name, method)
+    return methods
+
+
+class Route(NamedTuple):
+    """ Адрес сервиса для отправки сообщений по AMQP """
+    exchange: str
+    queue: str
+    routing_key: str
+
+
+def compile_service_route(service_schema: dict) -> Optional[Route]:
+    """ Адрес сервиса, None - сервис не поддерживает работу по AMQP """
+    try:
+        config = service_schema['AMQP']['config']
+        return Route(config['exchange'], config['quenue'], get_route_key(config['quenue']))
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+
+# Правило доступа: (разрешенные методы или None - все, запрещенные методы)
+RlsRule = Tuple[Optional[FrozenSet[str]], FrozenSet[str]]
+# Все методы разрешены
+ALLOW_ALL: RlsRule = (None, frozenset())
+
+
+def compile_service_rls(service_schema: dict) -> Optional[Dict[str, RlsRule]]:
+    """
+    Правила доступа из сервиса к другим сервисам {сервис - адресат: правило}.
+    None - у сервиса нет ограничений (нет RLS), отсутствие адресата - все методы адресата недоступны.
+    """
+    if 'RLS' not in service_schema:
+        return None
+
+    rules: Dict[str, RlsRule] = {}
+    for service_to_name, rule in service_schema['RLS'].items():
+        if rule is None:
+            rules[service_to_name] = ALLOW_ALL
+            continue
+        allowed = frozenset(rule['allowed'] or ()) if 'allowed' in rule else None
+        disallowed = frozenset(rule.get('disallowed') or ())
+        rules[service_to_name] = (allowed, disallowed)
+    return rules
+
+
+class RlsMatrix(object):
+    """ Скомпилированные правила доступа (RLS) всех сервисов схемы, проверка аналогична check_rls """
+
+    # Ограничение кеша текстов ошибок (имена методов приходят из сообщений)
+    DENIAL_CACHE_SIZE = 1024
+
+    def __init__(self, rules: Dict[str, Optional[Dict[str, RlsRule]]]):
+        """
+        :param rules: Правила сервисов {сервис - отправитель: compile_service_rls(схема сервиса)}
+        """
+        self.rules = rules
+        self._denial_errors: Dict[Tuple[str, str], dict] = {}
+
+    def is_allowed(self, service_from_name: str, service_to_name: str, method_name: str) -> bool:
+        """ Доступен ли метод сервиса - адресата из сервиса - отправителя """
+        service_rules = self.rules[service_from_name]
+        if service_rules is None:
+            return True
+        rule = service_rules.get(service_to_name)
+        if rule is None:
+            return False
+        allowed, disallowed = rule
+        return method_name not in disallowed and (allowed is None or method_name in allowed)
+
+    def check(self, service_from_name: str, service_to_name: str, method_name: str):
+        r"""
+        Проверка доступности метода.
+
+        Raises:
+            AllServiceMethodsNotAllowed - методы сервиса - адресата недоступны из сервиса - отправителя
+            ServiceMethodNotAllowed - метод недоступен
+        """
+        if self.is_allowed(service_from_name, service_to_name, method_name):
+            return
+        if service_to_name not in self.rules[service_from_name]:
+            raise AllServiceMethodsNotAllowed(service_from=service_from_name, name_service=service_to_name)
+        raise ServiceMethodNotAllowed(name_service=service_to_name, service_from=service_from_name,
+                                      name_method=method_name)
+
+    def denial_error(self, service_from_name: str, method_name: str) -> dict:
+        """ Текст ошибки для колбека на недоступный метод """
+        key = (service_from_name, method_name)
+        error = self._denial_errors.get(key)
+        if error is None:
+            if len(self._denial_errors) >= self.DENIAL_CACHE_SIZE:
+                self._denial_errors.clear()
+            error = {'error': f"Метод {method_name} не доступен из сервиса {service_from_name}"}
+            self._denial_errors[key] = error
+        return error
+
+
+class SchemaIndex(object):
+    """
+    Готовые объекты MethodApi, правила RLS и адреса AMQP для всех сервисов схемы,
+    поиск по (сервис, метод) за O(1)
+    """
+
+    def __init__(self, schema: dict, previous: 'SchemaIndex' = None):
+        """
+        :param schema: Схема апи
+        :param previous: Индекс предыдущей версии схемы, из него без перекомпиляции
+         берутся методы, правила RLS и адреса неизменившихся сервисов
+        """
+        self.schema = schema
+        # Копии описаний сервисов для сравнения со следующей версией схемы:
+        # изменения словаря схемы на месте не затрагивают копию
+        self.service_schemas: Dict[str, dict] = {}
+        # Сервисы, добавленные, измененные или удаленные относительно previous
+        self.changed_services: Set[str] = set()
+        self.methods: Dict[str, Dict[str, MethodApi]] = {}
+        self.routes: Dict[str, Optional[Route]] = {}
+        rls_rules: Dict[str, Optional[Dict[str, RlsRule]]] = {}
+        for service_name, service_schema in schema.items():
+            if not isinstance(service_schema, dict):
+                continue
+            self.service_schemas[service_name] = copy.deepcopy(service_schema)
+            if previous is not None and service_name in previous.methods \
+                    and previous.service_schemas[service_name] == service_schema:
+                self.methods[service_name] = previous.methods[service_name]
+                rls_rules[service_name] = previous.rls.rules[service_name]
+                self.routes[service_name] = previous.routes[service_name]
+                continue
+            self.methods[service_name] = compile_service_methods(service_schema)
+            self.routes[service_name] = compile_service_route(service_schema)
+            rls_rules[service_name] = compile_service_rls(service_schema)
+            self.changed_services.add(service_name)
+        if previous is not None:
+            self.changed_services.update(set(previous.methods) - set(self.methods))
+        self.rls = RlsMatrix(rls_rules)
+
+    def get_method(self, service_name: str, method_name: str) -> MethodApi:
+        r"""
+        Поиск метода сервиса.
+
+        Raises:
+            MethodNotFound - метод (или сервис) не найден в схеме
+        """
+        try:
+            return self.methods[service_name][method_name]
+        except KeyError:
+            raise MethodNotFound
+
+    def get_route(self, service_name: str) -> Route:
+        r"""
+        Адрес сервиса для отправки сообщений (ответов, колбеков).
+
+        Raises:
+            Exception - сервиса нет в схеме или он не поддерживает работу по AMQP (как get_queue_service)
+        """
+        try:
+            route = self.routes[service_name]
+        except KeyError:
+            raise Exception(f'{service_name} не существует в схеме АПИ!')
+        if route is None:
+            raise Exception(f'{service_name} не поддерживает работу по AMQP')
+        return route
@@ -1,13 +1,177 @@
+import abc
+import functools
 import hashlib
 import json
+import uuid
+from typing import Any, Callable, Iterable, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonCodec(object):
+    """
+    Серилизация и разбор сообщений стандартным json.
+    Вывод совпадает с json.dumps(message, ensure_ascii=True, default=str).
+    """
+    name = 'json'
+    # Вывод без пробелов после разделителей
+    compact = False
+
+    def __init__(self):
+        # Кодировщик создается один раз, а не при каждом вызове json.dumps
+        self._encoder = json.JSONEncoder(ensure_ascii=True, default=str)
+
+    def dumps(self, message: Any) -> str:
+        return self._encoder.encode(message)
+
+    def dumps_bytes(self, message: Any) -> bytes:
+        return self.dumps(message).encode('utf-8')
+
+    def loads(self, data: Union[bytes, bytearray, str]) -> Any:
+        return json.loads(data)
+
+    def append_fields(self, body: str, fields: dict) -> str:
+        """ Добавление полей в конец серилизованного объекта без повторной серилизации """
+        tail = self.dumps(fields)
+        if body == '{}':
+            return tail
+        return f'{body[:-1]},{tail[1:]}' if self.compact else f'{body[:-1]}, {tail[1:]}'
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    Разбор сообщений через orjson (сразу из байтов, без декодирования в строку).
+    Значения, которые orjson не поддерживает (NaN, целые больше 64 бит), разбираются стандартным json.
+
+    По умолчанию серилизация остается стандартной (как у JsonCodec): id сообщения - хеш от серилизованного
+    сообщения, поэтому вывод не меняется при установке orjson. Совместимость id с предыдущими версиями
+    библиотеки не гарантируется: id исходящих запросов вычисляется по порядку полей отправляемого сообщения.
+    С fast_dumps=True сообщения серилизуются через orjson (компактный вывод в UTF-8), id одинаковых
+    сообщений отличаются от id, полученных стандартной серилизацией.
+    """
+    name = 'orjson'
+
+    def __init__(self, fast_dumps: bool = False):
+        super().__init__()
+        if orjson is None:
+            raise ImportError('orjson не установлен')
+        self.fast_dumps = fast_dumps
+        self.compact = fast_dumps
+
+    @staticmethod
+    def _default(value):
+        return str(value)
+
+    def dumps(self, message: Any) -> str:
+        if not self.fast_dumps:
+            return super().dumps(message)
+        return self.dumps_bytes(message).decode('utf-8')
+
+    def dumps_bytes(self, message: Any) -> bytes:
+        if not self.fast_dumps:
+            return super().dumps_bytes(message)
+        return orjson.dumps(message, default=self._default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+    def loads(self, data: Union[bytes, bytearray, str]) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)
+
+
+# Кодек сообщений библиотеки, orjson используется для разбора, если установлен
+codec: JsonCodec = OrjsonCodec() if orjson is not None else JsonCodec()
+
+
+def set_codec(new_codec: JsonCodec):
+    """ Замена кодека сообщений (например OrjsonCodec(fast_dumps=True)) """
+    global codec
+    codec = new_codec
+
+
+def loads(data: Union[bytes, bytearray, str]) -> Any:
+    """ Разбор json сообщения из байтов или строки """
+    return codec.loads(data)
 
 
 def serialize_message(message: dict) -> str:
     """ Серилизация сообщения в json"""
-    return json.dumps(message, ensure_ascii=True, default=str)
+    return codec.dumps(message)
+
+
+def serialize_message_bytes(message: dict) -> bytes:
+    """ Серилизация сообщения в json (байты для отправки) """
+    return codec.dumps_bytes(message)
+
+
+class IdStrategy(abc.ABC):
+    """ Способ получения id сообщения по его серилизованному содержимому """
+
+    @abc.abstractmethod
+    def make_id(self, body: str) -> str:
+        """ id сообщения по серилизованному сообщению """
+
+    @abc.abstractmethod
+    def make_id_parts(self, parts: Iterable[Union[bytes, bytearray, memoryview]]) -> str:
+        """ id сообщения из нескольких частей (json часть и двоичные секции) """
+
+
+class HashId(IdStrategy):
+    """ id - хеш серилизованного сообщения (одинаковые сообщения получают одинаковый id) """
+
+    def __init__(self, hash_func: Callable = hashlib.md5):
+        self.hash_func = hash_func
+
+    def make_id(self, body: str) -> str:
+        return self.hash_func(body.encode('utf-8')).hexdigest()
+
+    def make_id_parts(self, parts: Iterable[Union[bytes, bytearray, memoryview]]) -> str:
+        hash_object = self.hash_func()
+        for part in parts:
+            hash_object.update(part)
+        return hash_object.hexdigest()
+
+
+class RandomId(IdStrategy):
+    """ Случайный id (uuid4), содержимое сообщения не хешируется """
+
+    def make_id(self, body: str) -> str:
+        return uuid.uuid4().hex
+
+    def make_id_parts(self, parts: Iterable[Union[bytes, bytearray, memoryview]]) -> str:
+        return uuid.uuid4().hex
+
+
+# md5 - как в предыдущих версиях, blake2b быстрее на больших сообщениях, длина id та же
+MD5_ID = HashId(hashlib.md5)
+BLAKE2B_ID = HashId(functools.partial(hashlib.blake2b, digest_size=16))
+RANDOM_ID = RandomId()
+
+id_strategy: IdStrategy = MD5_ID
+
+
+def set_id_strategy(new_id_strategy: IdStrategy):
+    """ Замена способа получения id сообщений (например BLAKE2B_ID или RANDOM_ID) """
+    global id_strategy
+    id_strategy = new_id_strategy
+
+
+def serialize_with_id(message: dict, strategy: IdStrategy = None) -> Tuple[str, str]:
+    """
+    Серилизация сообщения за один проход: id вычисляется по серилизованному сообщению
+    и дописывается последним полем.
+    :param strategy: Способ получения id, по умолчанию id_strategy
+    :return: (json сообщения с id, id)
+    """
+    body = codec.dumps(message)
+    message_id = (strategy or id_strategy).make_id(body)
+    return codec.append_fields(body, {'id': message_id}), message_id
 
 
 def create_hash(message: dict):
     """ Хеш-id """
-    return hashlib.md5(serialize_message(message).encode('utf-8')).hexdigest()
-
+    return id_strategy.make_id(codec.dumps(message))
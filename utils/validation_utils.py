@@ -5,15 +5,17 @@ import re
 import datetime
 import json
 import uuid
-from typing import Union, List, Tuple
+from typing import Union, List, Tuple, Optional, Callable, Any, Dict
 
 from .custom_exceptions import ServiceMethodNotAllowed, RequireParamNotSet, ParamNotFound, MethodNotFound, \
     ParamValidateFail, WrongTypeParam, WrongSizeParam, AllServiceMethodsNotAllowed
+from .framing import BINARY_TYPES, BINARY_VALUE_TYPES, is_binary_value
 from .messages import IncomingMessage
-from .utils_message import create_hash
+from .utils_message import IdStrategy
 
 
 class Config(abc.ABC):
+    __slots__ = ('address', 'username', 'password', 'timeout', 'port')
 
     def __init__(self, address, username, password, timeout: int, port: int):
         self.address = address
@@ -22,8 +24,20 @@ class Config(abc.ABC):
         self.timeout = timeout
         self.port = port
 
+    def get_timeout_seconds(self) -> Optional[float]:
+        """ Таймаут из схемы (миллисекунды) в секундах, None если не задан """
+        try:
+            timeout = float(self.timeout)
+        except (TypeError, ValueError):
+            return None
+        if timeout <= 0:
+            return None
+        return timeout / 1000
+
 
 class ConfigAMQP(Config):
+    __slots__ = ('quenue', 'virtualhost', 'exchange')
+
     def __init__(self, address, username, password, timeout, port, quenue, virtualhost, exchange):
         super().__init__(address, username, password, timeout, port)
         self.quenue = quenue
@@ -32,6 +46,7 @@ class ConfigAMQP(Config):
 
 
 class ConfigHTTP(Config):
+    __slots__ = ('auth', 'ssl', 'type', 'endpoint')
 
     def __init__(self, address, auth: bool, ssl: bool, type, endpoint, username, password, timeout: int,
                  port: int):
@@ -48,74 +63,230 @@ class ConfigHTTP(Config):
         return url
 
 
-class Param(object):
-
-    def __init__(self, type_param, length, is_required, name):
-        self.type = type_param
-        self.length = length
-        self.is_required = is_required
-        self.name = name
+DATE_REGEX = re.compile(r'^([0-9]{4})-([0-1][0-9])-([0-3][0-9])T([0-1][0-9]|[2][0-3]):([0-5][0-9]):([0-5][0-9])±(0['
+                        r'0-9]|1[0-9]|2[0-3]):([0-5][0-9])$')
 
-    def check_value(self, value: any):
-        value_type = self.type
-        size = self.length
 
-        if value_type == 'str':
-            if not isinstance(value, str):
-                raise WrongTypeParam(self.name, 'str')
-            if size is not None:
+def _compile_value_check(value_type: str, size, name: str, binary: bool = False) -> Callable[[Any], None]:
+    """
+    Специализированная функция проверки значения параметра с заранее вычисленными ограничениями
+    :param binary: Двоичные значения base64 допустимы (бинарный формат сообщения, см. framing)
+    """
+    if value_type == 'str':
+        if size is None:
+            def check(value):
+                if not isinstance(value, str):
+                    raise WrongTypeParam(name, 'str')
+        else:
+            def check(value):
+                if not isinstance(value, str):
+                    raise WrongTypeParam(name, 'str')
                 if len(value) > size:
-                    raise WrongSizeParam(self.name, size)
-        elif value_type == 'int':
-            if not isinstance(value, int):
-                raise WrongTypeParam(self.name, 'int')
-            if size is not None:
+                    raise WrongSizeParam(name, size)
+    elif value_type == 'int':
+        if size is None:
+            def check(value):
+                if not isinstance(value, int):
+                    raise WrongTypeParam(name, 'int')
+        else:
+            def check(value):
+                if not isinstance(value, int):
+                    raise WrongTypeParam(name, 'int')
                 if len(str(value)) > size:
-                    raise WrongSizeParam(self.name, size)
-        elif value_type == 'guid':
+                    raise WrongSizeParam(name, size)
+    elif value_type == 'guid':
+        def check(value):
             try:
                 uuid.UUID(value)
             except Exception:
-                raise WrongTypeParam(self.name, 'guid')
-        elif value_type == 'md5':
+                raise WrongTypeParam(name, 'guid')
+    elif value_type == 'md5':
+        def check(value):
             try:
                 hashlib.md5(value)
-            except:
-                raise WrongTypeParam(self.name, 'md5')
-        elif value_type == 'json':
+            except Exception:
+                raise WrongTypeParam(name, 'md5')
+    elif value_type == 'json':
+        def check(value):
             try:
                 json.loads(value)
-            except:
-                raise WrongTypeParam(self.name, 'json')
-        elif value_type == 'bin':
-            # TODO: разобраться в способе передачи bin
-            pass
-            # if not isinstance(value, bytes):
-            #     raise WrongTypeParam(self.name, 'bin')
-        elif value_type == 'base64':
-            if not isinstance(value, str):
-                raise WrongTypeParam(self.name, 'base64')
-            if not value.startswith('base64='):
-                ValueError('Параметр с типов base64 должен начинаться с base64=')
-        elif value_type == 'date':
-            value: str
-            regex = r'^([0-9]{4})-([0-1][0-9])-([0-3][0-9])T([0-1][0-9]|[2][0-3]):([0-5][0-9]):([0-5][0-9])±(0[' \
-                    r'0-9]|1[0-9]|2[0-3]):([0-5][0-9])$'
-            if not re.fullmatch(regex, value):
-                raise WrongTypeParam(self.name, 'date')
-        elif value_type == 'float':
+            except Exception:
+                raise WrongTypeParam(name, 'json')
+    elif value_type == 'base64':
+        # Двоичное значение передается без кодирования в base64 (см. framing)
+        allowed_types = (str, *BINARY_VALUE_TYPES) if binary else str
+
+        def check(value):
+            if not isinstance(value, allowed_types):
+                raise WrongTypeParam(name, 'base64')
+    elif value_type == 'date':
+        fullmatch = DATE_REGEX.fullmatch
+
+        def check(value):
+            if not isinstance(value, str) or not fullmatch(value):
+                raise WrongTypeParam(name, 'date')
+    elif value_type == 'float':
+        # Размер задается строкой вида '8.2': знаков до и после точки
+        common_limit = drob_limit = None
+        if size is not None:
+            limits = str(size).split('.')
+            common_limit = int(limits[0])
+            drob_limit = int(limits[1]) if len(limits) > 1 else None
+
+        def check(value):
             if not isinstance(value, float):
-                raise WrongTypeParam(self.name, 'float')
-            value_str = str(value)
-            common_length = len(value_str.split('.')[0])
-            drob_length = len(value_str.split('.')[1])
-            if common_length > int(size.split('.')[0]):
-                raise WrongSizeParam(self.name, size)
-            if drob_length > int(size.split('.')[1]):
-                raise WrongSizeParam(self.name, size)
-        elif value_type == 'bool':
+                raise WrongTypeParam(name, 'float')
+            if common_limit is None:
+                return
+            common, _, drob = str(value).partition('.')
+            if len(common) > common_limit or (drob_limit is not None and len(drob) > drob_limit):
+                raise WrongSizeParam(name, size)
+    elif value_type == 'bool':
+        def check(value):
             if not isinstance(value, bool):
-                raise WrongTypeParam(self.name, 'bool')
+                raise WrongTypeParam(name, 'bool')
+    else:
+        # bin и неизвестные типы не проверяются
+        # TODO: разобраться в способе передачи bin
+        def check(value):
+            pass
+
+    return check
+
+
+def _compile_column_check(value_type: str, size) -> Optional[Callable[[list], bool]]:
+    """
+    Быстрая проверка столбца значений одного типа.
+    Возвращает True, если все значения корректны; иначе значения проверяются по одному.
+    """
+    if value_type in ('str', 'base64'):
+        if size is None or value_type == 'base64':
+            return lambda values: all(isinstance(value, str) for value in values)
+        return lambda values: (all(isinstance(value, str) for value in values)
+                               and max(map(len, values), default=0) <= size)
+    if value_type == 'bool':
+        return lambda values: all(isinstance(value, bool) for value in values)
+    if value_type == 'int' and size is None:
+        return lambda values: all(isinstance(value, int) for value in values)
+    if value_type == 'bin':
+        return lambda values: True
+    return None
+
+
+class Param(object):
+    __slots__ = ('type', 'length', 'is_required', 'name', 'check_value', 'check_binary_value', 'check_column')
+
+    def __init__(self, type_param, length, is_required, name):
+        self.type = type_param
+        self.length = length
+        self.is_required = is_required
+        self.name = name
+        self.check_value: Callable[[Any], None] = _compile_value_check(type_param, length, name)
+        # Проверка значения сообщения в бинарном формате: base64 может быть двоичным
+        self.check_binary_value: Callable[[Any], None] = \
+            _compile_value_check(type_param, length, name, binary=True) if type_param == 'base64' else self.check_value
+        self.check_column: Optional[Callable[[list], bool]] = _compile_column_check(type_param, length)
+
+
+def compile_params_validator(params: Tuple[Param, ...]) -> Tuple[Callable[[List['InputParam'], bool], bool],
+                                                                 Callable[[dict], bool]]:
+    """
+    Компиляция проверки параметров метода. Функции не хранят изменяемого состояния.
+    :return: (проверка списка InputParam, проверка словаря {имя параметра: значение})
+    """
+    checks = {param.name: param.check_value for param in params}
+    binary_checks = {param.name: param.check_binary_value for param in params}
+    required = tuple(param.name for param in params if param.is_required)
+
+    def check_required(set_params):
+        for name in required:
+            if name not in set_params:
+                raise RequireParamNotSet(f'Обязательный параметр {name} не задан')
+
+    def validate_params(input_params: List[InputParam], binary_transport: bool = False) -> bool:
+        params_checks = binary_checks if binary_transport else checks
+        set_params = set()
+        for input_param in input_params:
+            check = params_checks.get(input_param.name)
+            if check is None:
+                raise ParamNotFound(f'Параметра с именем {input_param.name} не существует')
+            check(input_param.value)
+            set_params.add(input_param.name)
+        check_required(set_params)
+        return True
+
+    def validate_dict(params: dict) -> bool:
+        # Входящие сообщения в бинарном формате разбираются всегда
+        for name, value in params.items():
+            check = binary_checks.get(name)
+            if check is None:
+                raise ParamNotFound(f'Параметра с именем {name} не существует')
+            check(value)
+        check_required(params)
+        return True
+
+    return validate_params, validate_dict
+
+
+class _Missing(object):
+    def __repr__(self):
+        return 'MISSING'
+
+
+# Отсутствующее значение в столбцовом представлении пачки параметров
+MISSING = _Missing()
+
+
+def rows_to_columns(rows: List[dict]) -> Dict[str, list]:
+    """ Список словарей параметров в столбцы {имя параметра: [значения]}, пропуски заполняются MISSING """
+    names = {}
+    for row in rows:
+        names.update(dict.fromkeys(row))
+    return {name: [row.get(name, MISSING) for row in rows] for name in names}
+
+
+def compile_batch_validator(params: Tuple[Param, ...]) -> Callable[[Dict[str, list], int], List[Optional[Exception]]]:
+    """
+    Компиляция пакетной проверки параметров метода.
+    Проверка выполняется по столбцам, поэтому выбор проверки выполняется один раз на столбец.
+    :return: функция(столбцы, количество строк) -> список ошибок по строкам (None - строка корректна)
+    """
+    params_by_name = {param.name: param for param in params}
+    required = tuple(param.name for param in params if param.is_required)
+
+    def validate_columns(columns: Dict[str, list], rows_count: int) -> List[Optional[Exception]]:
+        errors: List[Optional[Exception]] = [None] * rows_count
+        for name, values in columns.items():
+            param = params_by_name.get(name)
+            if param is None:
+                error = ParamNotFound(f'Параметра с именем {name} не существует')
+                for index, value in enumerate(values):
+                    if value is not MISSING and errors[index] is None:
+                        errors[index] = error
+                continue
+
+            has_missing = any(value is MISSING for value in values)
+            if not has_missing and param.check_column is not None and param.check_column(values):
+                continue
+            check = param.check_binary_value
+            for index, value in enumerate(values):
+                if value is MISSING or errors[index] is not None:
+                    continue
+                try:
+                    check(value)
+                except (WrongTypeParam, WrongSizeParam) as e:
+                    errors[index] = e
+
+        for name in required:
+            values = columns.get(name)
+            error = RequireParamNotSet(f'Обязательный параметр {name} не задан')
+            for index in range(rows_count):
+                if errors[index] is None and (values is None or values[index] is MISSING):
+                    errors[index] = error
+
+        return errors
+
+    return validate_columns
 
 
 def convert_date_into_iso(convert_date: datetime.datetime) -> str:
@@ -128,6 +299,7 @@ def convert_date_into_iso(convert_date: datetime.datetime) -> str:
 
 
 class InputParam(object):
+    __slots__ = ('name', 'value')
 
     def __init__(self, name: str, value: any):
         self.name = name
@@ -145,14 +317,27 @@ class InputParam(object):
         """ Возвращает отформатирванное значение для серилизации """
         if isinstance(self.value, bytes):
             return self.value.decode('utf-8')
+        if isinstance(self.value, (bytearray, memoryview)):
+            return bytes(self.value).decode('utf-8')
 
         return self.value
 
     def to_dict(self):
         return {self.name: self.get_value()}
 
+    def get_transport_value(self, value_type: str, binary_transport: bool = False):
+        r"""
+        Значение для отправки с учетом типа параметра.
+        Двоичное значение параметра bin/base64 при binary_transport передается без изменений
+        (двоичной секцией сообщения), иначе как раньше (см. get_value).
+        """
+        if binary_transport and value_type in BINARY_TYPES and is_binary_value(self.value):
+            return self.value
+        return self.get_value()
+
 
 class MessageApi(object):
+    __slots__ = ('response_id', 'id', 'method', 'service_callback')
 
     def __init__(self):
         self.response_id = None
@@ -162,11 +347,14 @@ class MessageApi(object):
 
 
 class MethodApi(object):
+    __slots__ = ('params', '_validate_params', '_validate_dict', '_validate_batch', '_param_types',
+                 'type_conn', 'type_method', 'config', 'name')
 
     def __init__(self, params: dict, type_conn, type_method, config: dict, method_name):
-        self.params = list()
-        for name, value in params.items():
-            self.params.append(Param(*value, name=name))
+        self.params = tuple(Param(*value, name=name) for name, value in params.items())
+        self._validate_params, self._validate_dict = compile_params_validator(self.params)
+        self._validate_batch = compile_batch_validator(self.params)
+        self._param_types = {param.name: param.type for param in self.params}
         self.type_conn = type_conn
         self.type_method = type_method
         if type_conn == 'AMQP':
@@ -179,24 +367,30 @@ class MethodApi(object):
             ValueError(f'Неизвестный тип подключения {type_conn}')
         self.name = method_name
 
-    def check_params(self, input_params: List[InputParam]):
-        params_copy = self.params.copy()
-        for input_param in input_params:
-            # Проверка на существование параметра
-            try:
-                param = next(x for x in params_copy if x.name == input_param.name)
-            except StopIteration:
-                raise ParamNotFound(f'Параметра с именем {input_param.name} не существует')
-            # Проверка на тип
-            param.check_value(input_param.value)
-
-            param.is_set = True
-        # Проверка на наличие всех обязательных параметров
-        for param in params_copy:
-            if param.is_required and not hasattr(param, 'is_set'):
-                raise RequireParamNotSet(f'Обязательный параметр {param.name} не задан')
-
-        return True
+    def check_params(self, input_params: List[InputParam], binary_transport: bool = False):
+        """ :param binary_transport: Двоичные значения base64 допустимы (передаются без кодирования) """
+        return self._validate_params(input_params, binary_transport)
+
+    def check_params_dict(self, params: dict):
+        """ Проверка параметров в виде словаря {имя параметра: значение} без создания InputParam """
+        return self._validate_dict(params)
+
+    def check_params_batch(self, params: Union[List[dict], Dict[str, list]]) -> List[Optional[Exception]]:
+        r"""
+        Пакетная проверка параметров множества сообщений метода.
+
+        Args:
+            params: Список словарей параметров или столбцы {имя параметра: [значения]} одинаковой длины
+             (отсутствующее значение в столбце - MISSING).
+        Returns:
+            Ошибки по строкам в исходном порядке, None - параметры строки корректны
+        """
+        if isinstance(params, dict):
+            lengths = {len(values) for values in params.values()}
+            if len(lengths) > 1:
+                raise ValueError('Столбцы параметров должны быть одинаковой длины')
+            return self._validate_batch(params, lengths.pop() if lengths else 0)
+        return self._validate_batch(rows_to_columns(params), len(params))
 
     def get_url_http(self):
         return self.config.get_url(self.name)
@@ -213,19 +407,38 @@ class MethodApi(object):
             # return json.dumps(params, ensure_ascii=True, default=str)
             return params
 
+    def get_message_http_multipart(self, params: List[InputParam]) -> Tuple[dict, dict]:
+        r"""
+        Параметры для multipart запроса: (поля, двоичные параметры в виде файлов).
+        Поля multipart передаются строками, поэтому значения остальных типов приводятся через str()
+        (как в urlencoded теле обычного запроса).
+        """
+        self.check_params(params, binary_transport=True)
+        fields, files = {}, {}
+        for param in params:
+            value = param.get_transport_value(self._param_types[param.name], binary_transport=True)
+            if is_binary_value(value):
+                files[param.name] = value
+            else:
+                fields[param.name] = value if isinstance(value, str) else str(value)
+        return fields, files
+
     def get_message_amqp(self, params: List[InputParam], service_name: str,
-                         callback_method_name: str) -> IncomingMessage:
-        self.check_params(params)
+                         callback_method_name: str, binary_transport: bool = False,
+                         id_strategy: IdStrategy = None) -> IncomingMessage:
+        """
+        :param binary_transport: Передавать двоичные значения bin/base64 секциями бинарного формата
+         (получатель должен поддерживать формат, см. framing)
+        :param id_strategy: Способ получения id сообщения, по умолчанию общий для библиотеки
+        """
+        self.check_params(params, binary_transport)
         if isinstance(self.config, ConfigAMQP):
-            message: dict = {'service_callback': service_name,
-                             'method': self.name,
-                             'method_callback': callback_method_name}
-            for i in params:
-                message[i.name] = i.get_value()
-
-            hash_id = create_hash(message)
-            message['id'] = str(hash_id)
-            return IncomingMessage.from_dict(message)
+            return IncomingMessage.create(service_callback=service_name, method=self.name,
+                                          method_callback=callback_method_name,
+                                          params={i.name: i.get_transport_value(self._param_types[i.name],
+                                                                                binary_transport)
+                                                  for i in params},
+                                          binary_transport=binary_transport, id_strategy=id_strategy)
 
 
 def find_method(method_name, service_schema: dict):